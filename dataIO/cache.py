@@ -0,0 +1,173 @@
+"""On-disk cache for results of slow file readers (e.g. text formats read with `np.genfromtxt`).
+
+Cache is opt-in, enable it for all decorated readers with `set_cache(True)`, or
+for a single call by passing `cache=True` to the reader (also through `data2D.read_data`).
+Results are stored as `.npz` files, keyed by file path, modification time, size,
+reader and its arguments, so that a modified file or different options
+are read again from source.
+Files are stored in a folder `.pysurf_cache` next to each data file, or in
+a common folder if set with `set_cache(folder=...)`. When the size of a folder
+exceeds `maxsize` bytes, least recently used files are removed.
+
+2026/10/18 written for repeated reading of 4D, txt and points files.
+"""
+
+import os
+import hashlib
+import functools
+import numpy as np
+
+cache_settings = {'enabled': False,    # default for readers called without `cache`
+                  'folder': None,      # None: `.pysurf_cache` next to data file
+                  'maxsize': 2**30}    # bytes per cache folder
+
+CACHE_SUBFOLDER = '.pysurf_cache'
+
+def set_cache(enabled=True, folder=None, maxsize=None):
+    """Enable or disable cache, set cache folder (None for next to data files) and
+    maximum size in bytes for each cache folder."""
+    cache_settings['enabled'] = enabled
+    cache_settings['folder'] = folder
+    if maxsize is not None:
+        cache_settings['maxsize'] = maxsize
+    return cache_settings
+
+def cache_folder(filename):
+    """return the folder where cached results for `filename` are stored."""
+    if cache_settings['folder'] is not None:
+        return cache_settings['folder']
+    return os.path.join(os.path.dirname(os.path.abspath(filename)), CACHE_SUBFOLDER)
+
+def _key_repr(v):
+    """return a string identifying argument `v` for `cache_key`. Arrays are identified by
+    dtype, shape and hash of content (repr of large arrays is abbreviated), containers
+    are processed recursively."""
+    if isinstance(v, np.ndarray):
+        v = np.ascontiguousarray(v)
+        return 'ndarray(%s,%s,%s)'%(v.dtype.str, v.shape, hashlib.sha1(v.tobytes()).hexdigest())
+    if isinstance(v, (list, tuple)):
+        return '%s(%s)'%(type(v).__name__, ','.join(_key_repr(e) for e in v))
+    if isinstance(v, dict):
+        return 'dict(%s)'%','.join('%r:%s'%(k, _key_repr(e)) for k, e in sorted(v.items()))
+    return repr(v)
+
+def cache_key(filename, func, *args, **kwargs):
+    """return a string identifying the result of `func(filename, *args, **kwargs)`,
+    built from absolute path, modification time and size of file,
+    name of function and arguments (see `_key_repr`)."""
+    st = os.stat(filename)
+    key = repr((os.path.abspath(filename), st.st_mtime_ns, st.st_size,
+                func.__module__, func.__qualname__)) + _key_repr(args) + _key_repr(kwargs)
+    return hashlib.sha1(key.encode()).hexdigest()
+
+def _save(cfile, result):
+    """save `result` (array, string or tuple of them) to npz `cfile`.
+    Return False (and don't save) if result is not of a supported type."""
+    items = result if isinstance(result, tuple) else (result,)
+    arrays = {}
+    for i, v in enumerate(items):
+        if not isinstance(v, (np.ndarray, str)):
+            return False
+        v = np.asarray(v)
+        if v.dtype == object:
+            return False
+        arrays['arr_%i'%i] = v
+    os.makedirs(os.path.dirname(cfile), exist_ok=True)
+    tmp = cfile + '.%i.tmp.npz'%os.getpid()  # written to temp file to be safe with concurrent access
+    np.savez(tmp, tuple=isinstance(result, tuple), **arrays)
+    os.replace(tmp, cfile)
+    return True
+
+def _load(cfile):
+    """load a result saved with `_save`."""
+    with np.load(cfile, allow_pickle=False) as f:
+        n = len(f.files) - 1
+        items = [f['arr_%i'%i] for i in range(n)]
+        istuple = bool(f['tuple'])
+    items = [v.item() if v.dtype.kind == 'U' else v for v in items]
+    return tuple(items) if istuple else items[0]
+
+def evict(folder, maxsize=None):
+    """remove least recently used files from cache `folder` until total size is below `maxsize`."""
+    if maxsize is None:
+        maxsize = cache_settings['maxsize']
+    try:
+        entries = [e for e in os.scandir(folder) if e.name.endswith('.npz')
+                   and not e.name.endswith('.tmp.npz')]  # skip files being written
+    except FileNotFoundError:
+        return
+    entries = sorted(((e.stat().st_mtime, e.stat().st_size, e.path) for e in entries))
+    total = sum(e[1] for e in entries)
+    for mtime, size, path in entries:
+        if total <= maxsize:
+            break
+        try:
+            os.remove(path)
+            total = total - size
+        except OSError:
+            pass
+
+def clear_cache(folder):
+    """remove all cached files from `folder` (can be a cache folder or a data folder
+    containing a cache subfolder)."""
+    if os.path.basename(os.path.normpath(folder)) != CACHE_SUBFOLDER and \
+        os.path.isdir(os.path.join(folder, CACHE_SUBFOLDER)):
+        folder = os.path.join(folder, CACHE_SUBFOLDER)
+    evict(folder, maxsize=0)
+
+def cached_call(func, filename, *args, **kwargs):
+    """return `func(filename, *args, **kwargs)`, reading it from cache if available,
+    storing it otherwise."""
+
+    cfile = os.path.join(cache_folder(filename), cache_key(filename, func, *args, **kwargs) + '.npz')
+    if os.path.exists(cfile):
+        try:
+            result = _load(cfile)
+            os.utime(cfile)  # mark as recently used
+            return result
+        except (OSError, ValueError, KeyError):
+            pass  # corrupted or removed in the meanwhile, read again.
+    result = func(filename, *args, **kwargs)
+    try:
+        if _save(cfile, result):
+            evict(os.path.dirname(cfile))
+    except OSError:
+        pass  # e.g. read-only folder, cache is skipped.
+    return result
+
+def cached_reader(func):
+    """decorator for a reader function with signature `func(filename, *args, **kwargs)`,
+    to use cache according to `cache_settings` or to `cache` argument, if passed.
+    Results are cached only if made of arrays or strings."""
+
+    @functools.wraps(func)
+    def wrapper(filename, *args, cache=None, **kwargs):
+        if cache is None:
+            cache = cache_settings['enabled']
+        if not cache or not isinstance(filename, (str, os.PathLike)):
+            return func(filename, *args, **kwargs)
+        return cached_call(func, filename, *args, **kwargs)
+    return wrapper
+
+def test_cache(filename, reader, n=3, **kwargs):
+    """time `n` reads of `filename` with and without cache and check results are the same."""
+    import time
+    import tempfile
+
+    folder = tempfile.mkdtemp()
+    set_cache(False, folder=folder)
+    t0 = time.time()
+    for i in range(n):
+        r0 = reader(filename, **kwargs)
+    t1 = time.time()
+    for i in range(n):
+        r1 = reader(filename, cache=True, **kwargs)
+    t2 = time.time()
+    clear_cache(folder)
+    set_cache(False)
+
+    r0 = r0 if isinstance(r0, tuple) else (r0,)
+    r1 = r1 if isinstance(r1, tuple) else (r1,)
+    assert all(np.array_equal(a, b, equal_nan=True) for a, b in zip(r0, r1))
+    print('no cache: %.4f s, cache: %.4f s (%i reads)'%(t1-t0, t2-t1, n))
+    return t1-t0, t2-t1
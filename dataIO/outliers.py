@@ -9,6 +9,95 @@ class EmptyRangeWarning(RuntimeWarning):
     #def __init__(self, *args, **kwargs):
     #    super().__init__( *args, **kwargs)
 
+def _moments(v):
+    """return count, mean and sum of squared deviations of 1D array `v`, in float64."""
+    n = v.size
+    if n == 0:
+        return 0, 0., 0.
+    v = v.astype(np.float64, copy=False)
+    m = v.mean()
+    return n, m, np.sum((v - m)**2)
+
+def _combine(a, b):
+    """combine moments `a` and `b` (n, mean, M2), as returned by `_moments`."""
+    na, ma, m2a = a
+    nb, mb, m2b = b
+    if nb == 0:
+        return a
+    n = na + nb
+    d = mb - ma
+    return n, ma + d*nb/n, m2a + m2b + d**2*na*nb/n
+
+def sigma_clip(data: np.array,
+               nsigma: float = 3.,
+               itmax: int = 1,
+               chunksize: int = 2**20,
+               print_partial: bool = False):
+    """iterative sigma clipping on chunks of data. Returns mask (True on data to keep) and list of statistics (dict with `n`, `mean`, `std`, `nrejected`), one for initial valid data and one for each iteration.
+
+    Same criterion as `remove_outliers` (points with `abs(data-mean) >= nsigma*std` are rejected, until `itmax` iterations or convergence), but rejection and statistics of the kept points are computed in a single pass over data for each iteration (statistics are recomputed on all kept points, not updated with the rejected ones), without temporary masked copies of data. Data are processed in chunks of `chunksize` elements (statistics are accumulated in float64), so float32 and memory-mapped arrays are read without full-size temporary copies.
+
+    2026/10/18 written to replace repeated `nanmean`/`nanstd` over full array.
+    """
+
+    data = np.asanyarray(data)
+    M = np.empty(data.shape, dtype=bool)
+    flat = data.reshape(-1)  # view for contiguous arrays and memmaps
+    Mf = M.reshape(-1)
+    chunks = [slice(i, i+chunksize) for i in range(0, flat.size, chunksize)]
+
+    mom = (0, 0., 0.)
+    for sl in chunks:
+        c = flat[sl]
+        m = np.isfinite(c)
+        Mf[sl] = m
+        mom = _combine(mom, _moments(c[m]))
+    stats = [{'n': mom[0], 'mean': mom[1], 'std': np.sqrt(mom[2]/mom[0]) if mom[0] else np.nan, 'nrejected': 0}]
+
+    for i in range(1, itmax+1):
+        mean, sigmast = stats[-1]['mean'], stats[-1]['std']
+        thr = nsigma*sigmast
+        nrej = 0
+        mom = (0, 0., 0.)
+        for sl in chunks:
+            c = flat[sl].astype(np.float64, copy=False)
+            m = Mf[sl]
+            r = m & ~(np.abs(c - mean) < thr)
+            if r.any():
+                nrej += np.count_nonzero(r)
+                m &= ~r
+            # moments of kept points are recomputed in the same pass, subtracting the
+            # rejected ones loses precision when they dominate the variance.
+            mom = _combine(mom, _moments(c[m]))
+        sigma = np.sqrt(mom[2]/mom[0]) if mom[0] else np.nan
+        stats.append({'n': mom[0], 'mean': mom[1], 'std': sigma, 'nrejected': nrej})
+        if print_partial:
+            print (i, sigma, sigmast)
+        if nrej == 0 or mom[0] == 0:
+            break
+
+    return M, stats
+
+def clipped_span(data: np.array,
+                 nsigma: float = 3.,
+                 itmax: int = 1,
+                 flattening_func: Callable[[np.array],np.array] = None,
+                 chunksize: int = 2**20,
+                 **kwargs) -> list:
+    """return [min, max] of values of `data` accepted by sigma clipping (empty list if no data are left), e.g. to set color scale. If `flattening_func` is passed, `remove_outliers` is used."""
+
+    if flattening_func is not None:
+        M = remove_outliers(data, nsigma=nsigma, itmax=itmax, flattening_func=flattening_func, **kwargs)
+    else:
+        M, stats = sigma_clip(data, nsigma=nsigma, itmax=itmax, chunksize=chunksize, **kwargs)
+    if not np.any(M):
+        return []
+    flat = np.asanyarray(data).reshape(-1)
+    Mf = np.asarray(M).reshape(-1)
+    lims = [(c[m].min(), c[m].max()) for c, m in
+            ((flat[i:i+chunksize], Mf[i:i+chunksize]) for i in range(0, flat.size, chunksize)) if m.any()]
+    return [min(l[0] for l in lims), max(l[1] for l in lims)]
+
 def remove_outliers(data: np.array,
                     nsigma: float = 3.,
                     itmax: int = 1,
@@ -26,6 +115,7 @@ def remove_outliers(data: np.array,
         
         `span` argument is deprecated and it will be removed. Please update your code to use `from dataIO.span import span; span (remove_outliers(data,...))`.
 
+        2026/10/18 without `flattening_func` uses chunked `sigma_clip` (same mask up to rounding of statistics).
         """
         #see also dataIO.span.filtered_span
         
@@ -35,7 +125,16 @@ def remove_outliers(data: np.array,
     get_span = span  #rename variable
     from dataIO.span import span
     
-    if flattening_func is not None: data=flattening_func(data)
+    if flattening_func is None:
+        M, stats = sigma_clip(data, nsigma=nsigma, itmax=itmax, print_partial=print_partial)
+        if itmax <= 0 and print_partial:
+            print ("itmax = 0, just M valid data.")
+        if not (M).any():
+            warnings.warn('Returning empty array after filtering of outliers.',EmptyRangeWarning)
+            return []
+        return M
+    
+    data=flattening_func(data)
     
     M = np.isfinite(data)  #mask for good data
     sigma=np.nanstd(data[M])
@@ -147,6 +246,41 @@ def test_remove_outliers(a=None):
     b=remove_outliers(a,nsigma=0)
     print('nsigma=0',b,'\n--------------')    
 
+def _full_clip(a, nsigma, itmax):
+    """reference sigma clipping with full recalculation of statistics at each iteration."""
+    M = np.isfinite(a)
+    d = np.where(M, a, np.nan)
+    for i in range(itmax):
+        M = M & (np.abs(d - np.nanmean(d)) < nsigma*np.nanstd(d))
+        d = np.where(M, a, np.nan)
+    return M
+
+def test_sigma_clip(shape=(2000,2000), nsigma=2, itmax=5, dtype=np.float64):
+    """compare `sigma_clip` with full recalculation of statistics at each iteration, return mask and statistics.
+    Also check a case with few large outliers dominating the variance."""
+    import time
+    a = np.random.standard_normal(shape).astype(dtype)
+    a.flat[::97] += 8
+    a.flat[::1013] = np.nan
+
+    t0 = time.time()
+    M = _full_clip(a, nsigma, itmax)
+    t1 = time.time()
+    M1, stats = sigma_clip(a, nsigma=nsigma, itmax=itmax)
+    t2 = time.time()
+    print('full: %.3f s, sigma_clip: %.3f s, different points: %i'%(t1-t0, t2-t1, np.sum(M != M1)))
+    for i, s in enumerate(stats):
+        print(i, s)
+    assert np.array_equal(M, M1)
+
+    b = 5. + np.random.standard_normal((500, 500))*1e-3
+    b.flat[::50000] = 1e9
+    for it in (1, 2, 3):
+        Mb, sb = sigma_clip(b, nsigma=3, itmax=it)
+        assert np.array_equal(Mb, _full_clip(b, 3, it))
+        assert abs(sb[-1]['std'] - 1e-3) < 1e-4 and abs(sb[-1]['mean'] - 5.) < 1e-5
+    return M1, stats
+
 if __name__ == "__main__":
     a=np.arange(10)
     test_remove_outliers(a)
\ No newline at end of file
@@ -20,17 +20,96 @@ import matplotlib.pyplot as plt
 import numpy as np
 import pdb
 
+def _call_method(obj,name,args,kwargs):
+    """call method `name` of `obj`, top level function to be usable in process pool."""
+    return getattr(obj,name)(*args,**kwargs)
+
 class Superlist(list):
-    """A list of pySurf.Data2D objects on which unknown operations are performed serially."""    
+    """A list of pySurf.Data2D objects on which unknown operations are performed serially.
+    
+    Attributes that are not defined for the list are looked up on elements: properties
+    are returned as list of values, methods are called on each element and
+    results returned as list, of the same type if results are of the same type as elements.
+    By default methods are called serially, `set_backend` can be used to
+    call them in a pool of threads or processes (see `set_backend`)."""    
+    
+    # default execution backend, can be changed for an instance with `set_backend`
+    backend = {'executor':'serial','workers':None,'chunksize':1,'progress':False}
+    
+    def set_backend(self,executor='serial',workers=None,chunksize=1,progress=False):
+        """set how methods are broadcast to elements, return self.
+        
+        `executor` can be 'serial', 'thread', 'process' or a `concurrent.futures.Executor`.
+        `workers` is the number of threads or processes (None for default, number of cores).
+        `chunksize` is the number of elements sent together to each process (ignored for threads).
+        `progress` print progress of calls if True, or can be a function called
+            as `progress(i,n)` after each element is completed.
+        With 'process', elements and arguments must be picklable and methods are
+        called on copies of the elements (in-place modifications are lost)."""
+        
+        self.backend = {'executor':executor,'workers':workers,'chunksize':chunksize,'progress':progress}
+        return self
+    
+    def _broadcast(self,name,*args,**kwargs):
+        """call method `name` on all elements with backend from `set_backend`,
+        return list of results in same order as elements."""
+        from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+        
+        executor = self.backend['executor']
+        progress = self.backend['progress']
+        if progress is True:
+            progress = lambda i,n: print('%s: %i/%i'%(name,i,n),end='\n' if i==n else '\r')
+        n = len(self)
+        
+        if isinstance(executor,Executor):
+            pool = executor
+        elif executor == 'serial':
+            pool = None
+        elif executor == 'thread':
+            pool = ThreadPoolExecutor(max_workers=self.backend['workers'])
+        elif executor == 'process':
+            pool = ProcessPoolExecutor(max_workers=self.backend['workers'])
+        else:
+            raise ValueError("executor must be 'serial', 'thread', 'process' or an Executor, not %s"%executor)
+        
+        if pool is None:
+            results = (getattr(obj,name)(*args,**kwargs) for obj in self)
+        else:
+            results = pool.map(_call_method,self,[name]*n,[args]*n,[kwargs]*n,
+                           chunksize=self.backend['chunksize'])
+        try:
+            result = []
+            for i,r in enumerate(results):
+                result.append(r)
+                if progress: progress(i+1,n)
+        finally:
+            if pool is not None and pool is not executor:
+                pool.shutdown()
+        return result
     
     def __getattr__(self,name,*args,**kwargs): 
             # devo costruire una nuova funzione che preso un oggetto
             # lista ritorna un oggetto lista ottenuto dal valore restituito dalla funzione su ogni elemento.
+            if name.startswith('__'):
+                # special methods (e.g. used by copy and pickle) are not broadcast
+                raise AttributeError(name)
+            attr = [object.__getattribute__(name) for object in self]
+            if not all(hasattr(a, '__call__') for a in attr):
+                return attr
             def newfunc(*args, **kwargs):
-                attr = [object.__getattribute__(name) for object in self]
-                result = [a(*args, **kwargs) if hasattr(attr, '__call__') else a for a in attr]
-                return result
+                return self._wrap(self._broadcast(name,*args,**kwargs))
             return newfunc
+    
+    def _wrap(self,result):
+        """return `result` as list of same type as self, with same backend, if each
+        value is of the same type as corresponding element (e.g. Data2D returned
+        by Data2D methods), otherwise as plain list (e.g. scalars from `std`)."""
+        if not all(isinstance(r,type(o)) for r,o in zip(result,self)):
+            return list(result)
+        res = type(self)(result)
+        if 'backend' in self.__dict__:
+            res.backend = self.backend
+        return res
             
 
 ## DEVELOPMENT VERSIONS
@@ -280,8 +359,24 @@ def test_superlist(cls,obj=None):
     print(s.shape)
     print('\ntest method (np.flatten):')
     print(s.flatten())
-    
-    
+
+def test_superlist_backend(D,method='level',*args,**kwargs):
+    """time call of `method` on Superlist `D` with the different backends,
+    check that results are the same."""
+    import time
+
+    res = {}
+    for executor in ['serial','thread','process']:
+        t0 = time.time()
+        res[executor] = getattr(D.set_backend(executor),method)(*args,**kwargs)
+        print('%s: %.3f s'%(executor,time.time()-t0))
+    D.set_backend()
+    for executor in ['thread','process']:
+        assert all(np.array_equal(np.asarray(a.data if hasattr(a,'data') else a),
+                                  np.asarray(b.data if hasattr(b,'data') else b),equal_nan=True)
+                   for a,b in zip(res['serial'],res[executor]))
+    return res
+
 if __name__ == "__main__":
     test_superlist(superlist1)
         #test_superlist(superlist)
@@ -447,26 +447,115 @@ def reflect_profile(xx,yy,center=None,split=False,xout=None):
         
         
     
-def calculate_HEW(x,y,center=None,fraction=0.5,profile=False):
+def _cumulative_trapz(y,x,axis=-1):
+    """cumulative trapezoidal integral of `y` along `axis`, first element is zero."""
+    y=np.moveaxis(y,axis,-1)
+    x=np.moveaxis(x,axis,-1) if np.ndim(x)>1 else x
+    c=np.cumsum((y[...,1:]+y[...,:-1])/2*np.diff(x,axis=-1),axis=-1)
+    c=np.concatenate([np.zeros(c.shape[:-1]+(1,)),c],axis=-1)
+    return np.moveaxis(c,-1,axis)
+
+def calculate_HEW(x,y,center=None,fraction=0.5,profile=False,interp=False):
     """calculate HEW around center from profile x and y by integrating the two sides. If center is None, barycenter is calculated.
     Radius is returned that gives integrated height equal to `fraction`
     of total integral.
-    If `profile` is set, a profile x0,y0 of the integrated intensity is returned, where x0 is distance from `center` and y0 is integrated y."""
-    
-    x2 = np.array(x)
-    y2 = np.array(y)
+    If `profile` is set, a profile x0,y0 of the integrated intensity is returned, where x0 is distance from `center` and y0 is integrated y.
+    If `interp` is set, radius is linearly interpolated between points of the integrated 
+    profile, rather than being the first point above `fraction` of total.
+    For many profiles on same x, see `calculate_HEW_batch`.
+    2026/10/18 integral calculated with a single cumulative sum (was O(N**2))."""
     
     if center is None:
         center=calculate_barycenter(x,y)
     
-    xe,ye=reflect_profile(x,y,center=center)
-    intprof=[np.trapz(ye[:i],xe[:i]) for i in np.arange(len(xe))]
+    xe,ye=reflect_profile(np.asarray(x),np.asarray(y),center=center)
+    # integral up to each point excluded (as `np.trapz(ye[:i],xe[:i])` for each i) 
+    intprof=np.concatenate([[0],_cumulative_trapz(ye,xe)[:-1]])
     he=intprof[-1]*fraction
     if profile:
-        return xe,np.array(intprof)
+        return xe,intprof
+    elif interp:
+        return np.interp(he,intprof,xe)
     else:
         return xe[np.count_nonzero(intprof<=he)]
+
+def calculate_HEW_batch(x,y,center=None,fraction=0.5,profile=False,interp=False,chunksize=2**18):
+    """calculate HEW (as `calculate_HEW`) for all columns of 2D `y` (N x nprofiles, e.g. 2D output 
+    of `PSF_spizzichino`) on coordinates `x`.
+    `center` can be None (barycenter of each profile), scalar or one value for each profile.
+    If all profiles have same center, reflected `x` is sorted once and integrals of all
+    profiles are calculated together. Otherwise, each profile is reflected and sorted with
+    a stable sort (linear time on the two sorted runs of a reflected increasing `x`).
+    `chunksize` is not used and kept for compatibility.
+    Return array of HEW, one for each profile, or if `profile` is set, x and integrated intensity
+    as 2D arrays of same shape as `y`."""
+    
+    x=np.asarray(x,dtype=float)
+    y=np.asarray(y,dtype=float)
+    N,n=y.shape
+    if center is None:
+        center=np.array([calculate_barycenter(x,yy) for yy in y.T])
+    center=np.broadcast_to(np.asarray(center,dtype=float),(n,))
+    
+    if n==0 or np.all(center==center[0]):
+        # same reflection for all profiles (as `reflect_profile`)
+        c=center[0] if n else 0.
+        xr=np.where(x>=c,x,2*c-x)
+        i0=xr.argsort()
+        xe=xr[i0]
+        intprof=np.empty((N,n))
+        intprof[0]=0
+        intprof[1:]=_cumulative_trapz(y[i0,:],xe,axis=0)[:-1]
+        xe=np.broadcast_to(xe[:,None],(N,n))
+    else:
+        # profiles along rows of buffers, columns of `y` are copied to be contiguous
+        xe=np.empty((n,N))
+        ip=np.empty((n,N))
+        ip[:,0]=0
+        for i in range(n):
+            c=center[i]
+            xr=np.where(x>=c,x,2*c-x)
+            i0=np.argsort(xr,kind='stable')
+            xe[i]=xr[i0]
+            ip[i,1:]=_cumulative_trapz(np.ascontiguousarray(y[:,i])[i0],xe[i])[:-1]
+        xe,intprof=xe.T,ip.T
     
+    he=intprof[-1]*fraction
+    if profile:
+        return xe,intprof
+    elif interp:
+        return np.array([np.interp(h,ip,xx) for h,ip,xx in zip(he,intprof.T,xe.T)])
+    else:
+        return xe[np.count_nonzero(intprof<=he,axis=0),np.arange(n)]
+
+def test_calculate_HEW(sizes=(1000,3000,10000,100000),nold=10000):
+    """benchmark `calculate_HEW` on gaussian PSFs of different `sizes`, compared 
+    with previous O(N**2) implementation for sizes up to `nold`."""
+    import time
+    
+    for N in sizes:
+        x=np.linspace(-1,1,N)
+        y=np.exp(-x**2/0.01)
+        t0=time.time()
+        h=calculate_HEW(x,y)
+        t1=time.time()
+        s='N=%i: %.4f s'%(N,t1-t0)
+        if N<=nold:
+            xe,ye=reflect_profile(x,y,center=calculate_barycenter(x,y))
+            intprof=[np.trapezoid(ye[:i],xe[:i]) for i in np.arange(len(xe))]
+            h0=xe[np.count_nonzero(intprof<=intprof[-1]*0.5)]
+            s=s+', prefix trapz: %.4f s'%(time.time()-t1)
+            assert h==h0
+        print(s)
+    Y=np.exp(-(x[:,None]-np.linspace(-0.01,0.01,100)[None,:])**2/np.linspace(0.005,0.02,100)[None,:])
+    for center in (None,0.):
+        t0=time.time()
+        hb=calculate_HEW_batch(x,Y,center=center)
+        t1=time.time()
+        hs=[calculate_HEW(x,yy,center=center) for yy in Y.T]
+        t2=time.time()
+        assert np.array_equal(hb,hs)
+        print('100 PSFs of %i points, center=%s, batch: %.4f s, one by one: %.4f s'%(N,center,t1-t0,t2-t1))
     
 def plot_HEW(xout,yout,center=None,fraction=0.5):
     """Plots details of HEW calculation."""
@@ -498,17 +587,157 @@ def plot_HEW(xout,yout,center=None,fraction=0.5):
     return hew
 
 #PROFILE STATS AND DERIVED QUANTITIES
-def PSF_spizzichino(x,y,alpha=0,xout=None,energy=1.,level=True, HEW=True):
+def _spizzichino_intensity(x,yl,alpha,theta,lambda_mm,chunksize=None):
+    """intensity for angles `theta` (absolute, nangles x nprofiles) from tilt-removed profiles `yl` 
+    (N x nprofiles) at incidence `alpha` (rad, one for each profile), as in `PSF_spizzichino`. 
+    Angles are calculated in blocks for all profiles, each block of about `chunksize` elements 
+    (angles * profiles * len(x), default 4M) is a single vectorized operation. Return nangles x nprofiles array."""
+    
+    L=span(x,size=True)
+    deltax=L/(len(x))
+    scale=np.sqrt(2.)
+    k=2*np.pi/lambda_mm
+    if chunksize is None:
+        chunksize=2**22
+    Y=np.ascontiguousarray(yl.T)  # nprofiles x N
+    nt,m=theta.shape
+    a=np.sin(alpha)[None,:]-np.sin(theta)  # nangles x nprofiles
+    b=np.cos(alpha)[None,:]+np.cos(theta)
+    nb=max(1,chunksize//(len(x)*m))  #number of angles per block
+    
+    I=np.empty((nt,m))
+    for i in range(0,nt,nb):
+        sl=slice(i,i+nb)
+        phase=k*(x[None,None,:]*a[sl,:,None]-scale*Y[None,:,:]*b[sl,:,None])
+        # |sum(exp(i*phase))|**2 without building a complex array
+        I[sl]=(deltax/L)**2*(np.cos(phase).sum(axis=-1)**2+np.sin(phase).sum(axis=-1)**2)
+    return I
+
+def _nufft2(c,xi,msp=12):
+    """evaluate trigonometric sums `f[j,m] = sum_n c[j,n] exp(i (n-N//2) xi[m])` for
+    rows of `c` (J x N) at arbitrary points `xi` (M), 
+    with an oversampled fft and gaussian gridding (Greengard and Lee, SIAM Rev. 46, 443 (2004)).
+    Groups of rows with different points can be evaluated together passing `c` as (G x J x N)
+    and `xi` as (G x M), result is then (G x J x M).
+    `msp` is half width of gaussian kernel in grid points, relative accuracy is about 10**-msp."""
+    
+    c = np.asarray(c)
+    xi = np.asarray(xi,dtype=float)
+    single = c.ndim == 2
+    if single:
+        c,xi = c[None],xi[None]
+    G,J,N = c.shape
+    R = 2                           #oversampling
+    Mr = R*N
+    tau = np.pi*msp/(N**2*R*(R-0.5))
+    n = np.arange(N)-N//2
+    # deconvolve gaussian, then evaluate on uniform grid with a single fft for all rows
+    d = c*(np.sqrt(np.pi/tau)*np.exp(n**2*tau))
+    H = np.zeros((G,J,Mr),dtype=complex)
+    H[...,n%Mr] = d
+    H = np.fft.ifft(H,axis=-1)*Mr
+    
+    # convolve with gaussian at points xi, using 2*msp nearest grid points
+    h = 2*np.pi/Mr
+    xi = np.mod(xi,2*np.pi)
+    l0 = np.floor(xi/h).astype(int)
+    l = l0[...,None]+np.arange(-msp+1,msp+1)   # G x M x 2msp
+    g = np.exp(-(xi[...,None]-l*h)**2/(4*tau))/Mr
+    Hl = H[np.arange(G)[:,None,None,None],np.arange(J)[None,:,None,None],(l%Mr)[:,None,:,:]]
+    f = np.einsum('gjml,gml->gjm',Hl,g)
+    return f[0] if single else f
+
+def _spizzichino_intensity_nufft(x,yl,alpha,theta,lambda_mm,tol=1e-10,chunksize=None):
+    """same as `_spizzichino_intensity` for equally spaced `x`, calculated with 
+    non-uniform ffts. Height term is expanded in Taylor series around mid angle 
+    (with enough terms for relative accuracy `tol`), each term is a trigonometric 
+    sum in x, evaluated at all angles with `_nufft2`. Profiles are processed together
+    in blocks of about `chunksize` elements (default 4M).
+    Profiles with heights too large for the expansion (more than 100 terms) have nan intensity."""
+    
+    L=span(x,size=True)
+    deltax=L/(len(x))
+    scale=np.sqrt(2.)
+    k=2*np.pi/lambda_mm
+    dx=x[1]-x[0]
+    if chunksize is None:
+        chunksize=2**22
+    N=len(x)
+    nt,m=theta.shape
+    
+    # a, b are the coefficients of x and y in phase (profiles x angles). Global phase terms, 
+    #   the same for all points at a given angle, are dropped because only modulus is needed. 
+    a=np.sin(alpha)[:,None]-np.sin(theta.T)
+    b=np.cos(alpha)[:,None]+np.cos(theta.T)
+    b0=(np.max(b,axis=1)+np.min(b,axis=1))/2
+    yc=yl.T-np.mean(yl,axis=0)[:,None]
+    ymax=np.max(np.abs(yc),axis=1)
+    z=-1j*k*scale*ymax[:,None]*(b-b0[:,None])       # expansion variable for each angle
+    u=yc/np.where(ymax>0,ymax,1)[:,None]
+    
+    # number of terms for tol, for each profile
+    zmax=np.max(np.abs(z),axis=1)
+    nterms,term=np.ones(m,dtype=int),np.ones(m)
+    while True:
+        act=(term>tol)&(nterms<=100)
+        if not act.any():
+            break
+        term[act]=term[act]*zmax[act]/nterms[act]
+        nterms[act]=nterms[act]+1
+    ok=nterms<=100
+    
+    msp=int(min(16,max(4,np.ceil(-np.log10(tol))+1)))
+    I=np.full((m,nt),np.nan)
+    iok=np.where(ok)[0]
+    nmax=nterms[iok].max() if len(iok) else 1
+    pb=max(1,chunksize//(nmax*max(N,2*msp*nt)))  #profiles per block
+    for i in range(0,len(iok),pb):
+        p=iok[i:i+pb]
+        nt_b=nterms[p].max()
+        g=np.exp(-1j*k*scale*yc[p]*b0[p,None])
+        c=g[:,None,:]*u[p][:,None,:]**np.arange(nt_b)[None,:,None]  # profiles x nterms x N
+        T=_nufft2(c,k*dx*a[p],msp=msp)
+        
+        S=np.zeros((len(p),nt),dtype=complex)
+        zj=np.ones((len(p),nt),dtype=complex)
+        for j in range(nt_b):
+            S=S+zj*T[:,j]
+            zj=zj*z[p]/(j+1)
+        I[p]=(deltax/L)**2*np.abs(S)**2
+    return I.T
+
+def _level_columns(x,y):
+    """remove from each column of `y` the line through its end points (as `line`)."""
+    if np.isfinite(y[[0,-1]]).all():
+        L=span(x,size=1)
+        return y-((x-x[0])[:,None]*(y[-1]-y[0])[None,:]/L+y[0])
+    return np.column_stack([yy-line(x,yy) for yy in y.T])
+    
+def PSF_spizzichino(x,y,alpha=0,xout=None,energy=1.,level=True, HEW=True, chunksize=None, method='direct', tol=1e-10):
     """Try to use spizzichino theory as in PR notes to calculate Hthe PSF,
     return a vector of same length as xout.
     alpha is incidence angle from normal in degrees, alpha= 90 - shell slope for tilt removed profiles.
         Tilt can be included in the profile, in that case alpha is left to 0
        (total slope must be <0 and alpha>0, this means that profile with tilt is expected to be <0).
     xout can set the output intervals in theta on the focal plane (from specular angle), if not set 512 points are used.
-    Lambda is wavelength in keV."""
+    Lambda is wavelength in keV.
+    If `y` is 2D, each column is a profile and an array (len(xout), ncols) is returned,
+    if `xout` is not set, output angles for the first profile are used for all. 
+    All profiles are calculated together, sum over profile points is calculated for 
+    blocks of angles and profiles (see `chunksize` in `_spizzichino_intensity`) 
+    rather than one angle at a time.
+    If `method` is 'nufft' and `x` is equally spaced, sums are calculated with
+    non-uniform fft (see `_spizzichino_intensity_nufft`) with relative accuracy `tol`,
+    much faster for many points and angles. It falls back to direct sum for profiles with too large heights.
+    2026/10/18 vectorized on blocks of angles and profiles, added 2D `y` and `method`."""
     
     lambda_mm=12.398425/energy/10**7
     
+    x=np.asarray(x,dtype=float)
+    y=np.asarray(y,dtype=float)
+    single=y.ndim==1
+    Y=y.reshape(len(y),-1)  # N x nprofiles
+    
     if xout is None:
         lout=1001
     else:
@@ -518,25 +747,38 @@ def PSF_spizzichino(x,y,alpha=0,xout=None,energy=1.,level=True, HEW=True):
     
     #calculate and remove slope as alpha. Profile tilt removed is yl
     if level: 
-        slope=line(x,y)
-        yl=y-slope
+        yl=_level_columns(x,Y)
         #adjust incidence angle to include the slope removed from profile leveling. 
         # Increasing profile is positive slope angle:
-        alpha=alpha*np.pi/180-np.arctan2(y[-1]-y[0],x[-1]-x[0])
+        alpha=alpha*np.pi/180-np.arctan2(Y[-1]-Y[0],x[-1]-x[0])
     else:
-        yl=y
+        yl=Y
+        alpha=np.full(Y.shape[1],alpha,dtype=float)
         
-    if alpha<=0: raise ValueError
+    if np.any(alpha<=0): raise ValueError
     
-    thmax= lambda_mm/(2*deltax*(np.pi/2-alpha))
-    #xout is the array of theta for the output
+    thmax= lambda_mm/(2*deltax*(np.pi/2-alpha[0]))
+    #theta is the array of angles for the output (same offset from alpha for all profiles)
     if xout is None:
-        xout=np.linspace(alpha-thmax,alpha+thmax,lout)
+        xout=np.linspace(alpha[0]-thmax,alpha[0]+thmax,lout)
+        theta=(xout-alpha[0])[:,None]+alpha[None,:]
+        theta[:,0]=xout
     else:
-        xout=xout+alpha
-        
-    scale=np.sqrt(2.)
-    I=np.array([np.abs((deltax/L*(np.exp(2*np.pi*1.j/lambda_mm*(x*(np.sin(alpha)-np.sin(theta))-scale*yl*(np.cos(alpha)+np.cos(theta)))))).sum())**2 for theta in xout])
+        theta=np.asarray(xout,dtype=float)[:,None]+alpha[None,:]
+    
+    I=None
+    if method=='nufft':
+        if not np.allclose(np.diff(x),x[1]-x[0],rtol=1e-9,atol=0):
+            raise ValueError("method 'nufft' requires equally spaced x")
+        I=_spizzichino_intensity_nufft(x,yl,alpha,theta,lambda_mm,tol=tol,chunksize=chunksize)
+        bad=np.isnan(I).all(axis=0)
+        if bad.any():
+            print("WARNING: profile heights too large for nufft method in PSF_spizzichino, using direct sum for %i profiles."%bad.sum())
+            I[:,bad]=_spizzichino_intensity(x,yl[:,bad],alpha[bad],theta[:,bad],lambda_mm,chunksize=chunksize)
+    elif method!='direct':
+        raise ValueError("method must be 'direct' or 'nufft': %s"%method)
+    if I is None:
+        I=_spizzichino_intensity(x,yl,alpha,theta,lambda_mm,chunksize=chunksize)
     """
     The above is equivalent to (iterate on all theta in xout):
     I[theta]=np.abs((deltax/L*(np.exp(2*np.pi*1.j/lambda_mm*(x*(np.sin(alpha)-np.sin(theta))-scale*yl*(np.cos(alpha)+np.cos(theta)))))).sum())**2
@@ -544,8 +786,9 @@ def PSF_spizzichino(x,y,alpha=0,xout=None,energy=1.,level=True, HEW=True):
     
     #if HEW:
     #    calculate_HEW(xout-alpha,I,center=None,fraction=0.5)
-        
-    return xout-alpha,I
+    
+    xout=theta[:,0]-alpha[0]
+    return (xout,I[:,0]) if single else (xout,I)
 
 def PSF_raimondiSR(x,y,alpha=0,xout=None,energy=1.):
     """Try to use theory from Raimondi and Spiga A&A2015 to calculate the PSF for single reflection,
@@ -552,12 +552,12 @@ class Profile(object):  #np.ndarrays
     resample=update_docstring(resample,resample_profile)
 
 
-    def psd(self,wfun=None,rmsnorm=True,norm=1):
+    def psd(self,wfun=None,rmsnorm=True,norm=1,workers=None):
         """return a PSD object with psd of self. """
 
-        f,p=profpsd(self.x,self.y,wfun=wfun,norm=norm,rmsnorm=rmsnorm)
+        f,p=profpsd(self.x,self.y,wfun=wfun,norm=norm,rmsnorm=rmsnorm,workers=workers)
 
-        return PSD(p,self.x,f,units=self.units,name="")
+        return PSD(f,p,units=self.units,name="")
     psd=update_docstring(psd,profpsd)
 
     def remove_nan_ends(self,*args,**kwargs):
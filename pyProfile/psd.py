@@ -1,4 +1,5 @@
 from pyProfile.profile import line, make_signal
+import functools
 import numpy as np
 from dataIO.span import span
 import matplotlib.pyplot as plt
@@ -57,27 +58,107 @@ def normPSD(N,L=None,form=1):
                     #and in formula 12.1.10 as discrete form of Parsifal's theorem
     return factor
     
-def psd(x,y,retall=False,wfun=None,norm=1,rmsnorm=False):
+class PSDPlan(object):
+    """Window, normalization factor and frequencies for psd of `N` points on 
+    a length `L` with window function `wfun` and normalization `norm` (see `normPSD`).
+    
+    Don't create directly, use `psd_plan` that returns cached plans, 
+    so they are calculated only once for data of same size.
+    If `workers` is set, ffts are calculated with `scipy.fft` in parallel on `workers` 
+    threads (-1 for all cores), otherwise `np.fft` is used."""
+    
+    def __init__(self,N,L,wfun=None,norm=1,workers=None):
+        self.N = N
+        self.L = L
+        self.workers = workers
+        self.win = np.ones(N) if wfun is None else np.asarray(wfun(N),dtype=float)
+        self.normfactor = normPSD(N,L,form=norm)
+        self.freqs = np.fft.rfftfreq(N,float(L)/(N-1))
+        # plan is shared between calls, make sure arrays are not modified
+        self.win.flags.writeable = False
+        self.freqs.flags.writeable = False
+    
+    def window(self,axis=0,ndim=1):
+        """return window shaped to be broadcast along `axis` of an `ndim` array."""
+        shape = [1]*ndim
+        shape[axis] = self.N
+        return self.win.reshape(shape)
+    
+    def rfft(self,y,axis=0):
+        """return rfft of windowed `y` along `axis`."""
+        win = self.window(axis,np.ndim(y))
+        if np.result_type(y) == np.float32:
+            win = win.astype(np.float32)  # keep single precision
+        yw = y*win
+        if self.workers is None:
+            return np.fft.rfft(yw,axis=axis)
+        import scipy.fft
+        return scipy.fft.rfft(yw,axis=axis,workers=self.workers)
+    
+    def __repr__(self):
+        return "<PSDPlan N=%i L=%g>"%(self.N,self.L)
+
+@functools.lru_cache(maxsize=64)
+def psd_plan(N,L,wfun=None,norm=1,workers=None):
+    """return a (cached) `PSDPlan` for psd of `N` points on length `L`. 
+    Use `psd_plan.cache_clear()` to empty the cache."""
+    return PSDPlan(N,L,wfun=wfun,norm=norm,workers=workers)
+
+def welch_segments(y,nperseg,noverlap=None):
+    """return segments of `nperseg` points along first axis of `y`, overlapping by
+    `noverlap` points (default half segment), as a view with shape (nsegments, nperseg, ...).
+    Points at the end of `y` that don't fill a segment are discarded."""
+    
+    N = np.shape(y)[0]
+    if noverlap is None:
+        noverlap = nperseg//2
+    if nperseg > N or nperseg < 2:
+        raise ValueError("nperseg must be between 2 and number of points (%i): %s"%(N,nperseg))
+    if not 0 <= noverlap < nperseg:
+        raise ValueError("noverlap must be between 0 and nperseg-1: %s"%noverlap)
+    segs = np.lib.stride_tricks.sliding_window_view(y,nperseg,axis=0)
+    return np.moveaxis(segs,-1,1)[::nperseg-noverlap]
+
+def psd(x,y,retall=False,wfun=None,norm=1,rmsnorm=False,workers=None,nperseg=None,noverlap=None):
     """return frequencies and PSD of a profile.
     
     If retall is set, also the phase is returned.
     PSD is squared FFT divided by step size. Profile is assumed real, so only positive freqs are used, doubling PSD values. Return value has ceil(N/2) elements (always odd).
     See `np.fft.rfftfreq` for details.
     wfun is a function that given the number of points return a vector with values for the window. Note that normalization is quite arbitrary, usually it's rescaled later with rmsnorm.
+    `workers` is the number of threads for fft (see `PSDPlan`).
+    If `nperseg` is set, psd is averaged over segments of `nperseg` points overlapping 
+    by `noverlap` points (Welch method, default overlap half segment), giving less
+    noisy estimate with lower frequency resolution. Segments are transformed together
+    in a single fft, each is windowed and normalized (also with `rmsnorm`) as a profile.
     2017/07/30 if rmsnorm is set True, PSD is normalized to (multiplied by) rms calculated from profile (must be same if no window applied). 
     2016/03/26 this psd i return to old normalizaiton "time-integral squared magnitude", multiplying by dx.
+    2026/10/18 window, normalization and frequencies are reused from cached `psd_plan`.
     """
     
-    if wfun is None:
-        win=np.ones(len(y))
-    else:
-        win=wfun(len(x))
+    if nperseg is not None:
+        if retall:
+            raise ValueError("phase can't be returned (`retall`) in Welch mode (`nperseg` set)")
+        segs=welch_segments(y,nperseg,noverlap)  # nseg x nperseg
+        plan=psd_plan(nperseg,span(x[:nperseg],True),wfun=wfun,norm=norm,workers=workers)
+        normfactor=plan.normfactor
+        if rmsnorm:
+            win=plan.window(axis=1,ndim=2)
+            normfactor=normfactor*np.nanstd(segs,axis=1)**2/np.nanstd(segs*win,axis=1)**2
+            normfactor=normfactor[:,None]
+        psd=2*normfactor*np.abs(plan.rfft(segs,axis=1))**2
+        psd=np.mean(psd,axis=0)
+        psd[0]=psd[0]/2
+        return plan.freqs.copy(),psd
+    
     N = len(y)
     L=span(x,True)
+    plan=psd_plan(N,L,wfun=wfun,norm=norm,workers=workers)
+    win=plan.win
     
-    yfft  = np.fft.rfft(y*win) #note that rfft return exact values as fft (needs to be doubled after squaring amplitude)
+    yfft  = plan.rfft(y) #note that rfft return exact values as fft (needs to be doubled after squaring amplitude)
     
-    normfactor=normPSD(N,L,form=norm)
+    normfactor=plan.normfactor
     if rmsnorm:  #normalize to rms of non windowed function. This is independent on 0 constant term, 
     # but also alter its meaning 
         normfactor=normfactor*np.nanstd(y)**2/np.nanstd(y*win)**2
@@ -85,7 +166,7 @@ def psd(x,y,retall=False,wfun=None,norm=1,rmsnorm=False):
     psd  = 2*normfactor*np.abs(yfft)**2
     psd[0]=psd[0]/2  #the first component is not doubled
     
-    freqs=np.fft.rfftfreq(N,np.float(L)/(N-1))
+    freqs=plan.freqs.copy()
     if retall:
         return freqs,psd,np.angle(yfft)
     else:
@@ -6,7 +6,7 @@ from numpy import ma
 import os
 import pdb
 from copy import deepcopy
-from pyGeneralRoutines.span import span
+from dataIO.span import span
 from matplotlib import pyplot as plt
 import numpy as np
 import os
@@ -50,11 +50,55 @@ class Points(object):
         self.points=pts
         return pts
 
-    def __init__(self,filename=None,*args,**kwargs):
-        if filename is None:
-            return self
-        else:
+    def __init__(self,filename=None,*args,points=None,**kwargs):
+        """2026/10/18 points can be passed directly as array (keyword only,
+        other arguments are passed to `load`)."""
+        self._points=None
+        self._tree=None
+        if filename is not None:
             self.load(filename,*args,**kwargs)
+        elif points is not None:
+            self.points=points
+
+    @property
+    def points(self):
+        return self._points
+
+    @points.setter
+    def points(self,value):
+        """setting points discards the spatial index."""
+        self._points=value
+        self._tree=None
+
+    @property
+    def tree(self):
+        """KD-tree on xy of points (`points.points_tree`), built at first use and kept until
+        points are changed by assignment (modify `self.points` in place only on z, or reassign it)."""
+        if self._tree is None:
+            self._tree=P.points_tree(self.points)
+        return self._tree
+
+    def crop(self,xrange=None,yrange=None,zrange=None,poly=None,mask=False):
+        """return points inside xrange, yrange (and zrange, polygon `poly`), or their mask if `mask` is set,
+        testing only points near the region (from `tree`). Points are not modified."""
+        return P.crop_points(self.points,xrange,yrange,zrange,mask=mask,poly=poly,tree=self.tree)
+
+    def in_poly(self,verts):
+        """return mask of points inside polygon with vertices `verts`."""
+        return P.points_in_poly(self.points,verts,tree=self.tree)
+
+    def smooth(self,radius,k=32):
+        """return points with z averaged on neighbours within `radius` (up to `k`), see `points.radius_smooth_points`."""
+        return P.radius_smooth_points(self.points,radius,k=k,tree=self.tree)
+
+    def resample_nearest(self,positions,k=1,radius=np.inf):
+        """resample on `positions` from `k` nearest neighbours, see `points.resample_nearest`."""
+        return P.resample_nearest(self.points,positions,k=k,radius=radius,tree=self.tree)
+
+    def merge_duplicates(self,tol=0.):
+        """replace points closer than `tol` with their average, see `points.merge_duplicates`."""
+        self.points=P.merge_duplicates(self.points,tol,tree=self.tree)
+        return self.points
             
     def translate(self,offset=None):
         """returns translated coordinates of 2D point(s) x ([Npoints x 2]) by an offset.
@@ -203,16 +247,6 @@ class Points(object):
         return np.sqrt(np.nanmean(z**2))
         
 
-    def crop(self, xrange=None,yrange=None):
-        """crop a xyz points [Nx3], keeping only points inside xrange and yrange defined as (min,max)."""
-        if xrange != None: 
-            points=points[np.where(xrange[0]<points[:,0]),:][0]
-            points=points[np.where(points[:,0]<xrange[1]),:][0]
-        if yrange != None: 
-            points=points[np.where(yrange[0]<points[:,1]),:][0]
-            points=points[np.where(points[:,1]<yrange[1]),:][0]
-        return points
-        
     def subtract_points(p1,p2,xySecond=False):
         """Subtract second set of points after interpolation on first set coordinates.
         If xySecond is set to True data are interpolate on xy of p2 and then subtracted."""
@@ -0,0 +1,185 @@
+"""Affine warp of data on a rectilinear grid, without conversion to points.
+
+Each node of the target grid is mapped back through the inverse transformation to
+(fractional) indices of the source grid and data are sampled there with
+`scipy.ndimage.map_coordinates`. Coordinates are in axis units, so non-square pixels and
+non-uniform axes are handled correctly (unlike `ndimage.rotate`, which works on indices).
+A result is nan outside the source grid or if any source node with nonzero weight
+(in bilinear interpolation) is nan. Coordinate maps for a couple of grids and a
+transformation are cached, so that repeated warps (e.g. same transformation applied to
+a list of data) skip their calculation.
+
+Transformations are 3 x 3 matrices `M` acting on homogeneous coordinates
+(`[x', y', 1] = M @ [x, y, 1]`), they can be obtained from functions acting on points
+(e.g. as returned by `affine2D.find_affine`) with `affine_matrix`.
+
+2026/10/18 written to replace points round-trip (`points_autoresample`) in
+`data2D.apply_transform` and `ndimage.rotate` in `data2D.rotate_data`.
+"""
+
+import hashlib
+from collections import OrderedDict
+import numpy as np
+from scipy.ndimage import map_coordinates
+
+_coords_cache = OrderedDict()
+COORDS_CACHE_SIZE = 4  # maps are full size, keep a few
+
+def rotation_matrix(ang, center=(0, 0)):
+    """return matrix of anticlockwise rotation of `ang` degrees about `center`
+    (same as `points.rotate_points`)."""
+    th = ang/180.*np.pi
+    c, s = np.cos(th), np.sin(th)
+    tx, ty = center
+    return np.array([[c, -s, tx - c*tx + s*ty],
+                     [s, c, ty - s*tx - c*ty],
+                     [0., 0., 1.]])
+
+def affine_matrix(trans, x, y, rtol=1e-9):
+    """return 3 x 3 matrix of transformation `trans` (a function from points Nx3 to Nx3)
+    if it is affine in x, y and leaves z unchanged on the grid `x`, `y`, None otherwise.
+    The function is probed on a few points over the grid: corners, center and some
+    random points, all with two different values of z."""
+
+    x0, x1 = np.min(x), np.max(x)
+    y0, y1 = np.min(y), np.max(y)
+    rng = np.random.default_rng(0)
+    u = np.concatenate([[0, 1, 0, 1, 0.5], rng.uniform(size=4)])
+    v = np.concatenate([[0, 0, 1, 1, 0.5], rng.uniform(size=4)])
+    xy = np.stack([x0 + u*(x1 - x0), y0 + v*(y1 - y0)], axis=1)
+    probe = np.vstack([np.hstack([xy, np.zeros((len(xy), 1))]),
+                       np.hstack([xy, np.ones((len(xy), 1))])])
+    try:
+        out = np.asarray(trans(probe), dtype=float)
+    except Exception:
+        return None
+    if out.shape != probe.shape or not np.isfinite(out).all():
+        return None
+
+    X = np.hstack([probe[:, :2], np.ones((len(probe), 1))])
+    A = np.linalg.lstsq(X, out[:, :2], rcond=None)[0]
+    scale = max(x1 - x0, y1 - y0, np.abs(out[:, :2]).max(), 1.)
+    if np.abs(X @ A - out[:, :2]).max() > rtol*scale:
+        return None  # not affine or xy depend on z
+    if np.abs(out[:, 2] - probe[:, 2]).max() > rtol:
+        return None  # z is modified
+    return np.vstack([A.T, [0., 0., 1.]])
+
+def warp_grid(M, x, y):
+    """return axes of a grid covering the grid `x`, `y` transformed by `M`,
+    with same steps and orientation as `x`, `y`."""
+
+    corners = np.array([[x[0], y[0], 1], [x[-1], y[0], 1], [x[0], y[-1], 1], [x[-1], y[-1], 1]], dtype=float)
+    c = corners @ np.asarray(M, dtype=float).T
+    axes = []
+    for v, lim in ((x, c[:, 0]), (y, c[:, 1])):
+        step = np.abs(v[-1] - v[0])/(len(v) - 1) if len(v) > 1 else 1.
+        n = int(np.floor((lim.max() - lim.min())/step*(1 + 1e-9))) + 1
+        a = lim.min() + np.arange(n)*step
+        if len(v) > 1 and v[-1] < v[0]:
+            a = a[::-1]
+        axes.append(a)
+    return axes
+
+def _fractional_index(v, vt):
+    """return fractional index on axis `v` (monotonic) of values `vt`,
+    out of range (-1) outside `v`."""
+    v = np.asarray(v, dtype=float)
+    if len(v) < 2:
+        return np.where(vt == v[0], 0., -1.)
+    d = np.diff(v)
+    if np.allclose(d, d[0], rtol=1e-9, atol=0):  # uniform, avoid interpolation
+        i = (vt - v[0])/d[0]
+        return np.where((i > -1e-9) & (i < len(v) - 1 + 1e-9), np.clip(i, 0, len(v) - 1), -1.)
+    if d[0] < 0:
+        return np.interp(vt, v[::-1], np.arange(len(v), dtype=float)[::-1], left=-1., right=-1.)
+    return np.interp(vt, v, np.arange(len(v), dtype=float), left=-1., right=-1.)
+
+def warp_coordinates(M, x, y, xt, yt):
+    """return array [2 x len(yt) x len(xt)] of fractional (row, column) indices on grid `x`, `y`
+    of the nodes of grid `xt`, `yt` mapped back through the inverse of `M`,
+    from cache if already calculated."""
+
+    arrs = [np.asarray(v, dtype=float) for v in (M, x, y, xt, yt)]
+    key = tuple(hashlib.sha1(v.tobytes()).hexdigest() for v in arrs)
+    if key in _coords_cache:
+        _coords_cache.move_to_end(key)
+        return _coords_cache[key]
+
+    M, x, y, xt, yt = arrs
+    Mi = np.linalg.inv(M)
+    # source coordinates are separable sums of terms in xt and yt
+    xs = (Mi[0, 0]*xt)[None, :] + (Mi[0, 1]*yt + Mi[0, 2])[:, None]
+    ys = (Mi[1, 0]*xt)[None, :] + (Mi[1, 1]*yt + Mi[1, 2])[:, None]
+    coords = np.stack([_fractional_index(y, ys), _fractional_index(x, xs)])
+
+    _coords_cache[key] = coords
+    if len(_coords_cache) > COORDS_CACHE_SIZE:
+        _coords_cache.popitem(last=False)
+    return coords
+
+def warp_data(data, x, y, M, xt=None, yt=None, order=1, fill_value=np.nan):
+    """apply affine transformation `M` (3 x 3 matrix, see `affine_matrix`) to `data` on grid `x`, `y`.
+    Data are resampled on grid `xt`, `yt`, by default covering the transformed data with same steps
+    (see `warp_grid`), with interpolation of `order` 0 to 3.
+    Return data, xt, yt, with `fill_value` outside the source data and close to nan."""
+
+    if order not in (0, 1, 2, 3):
+        raise ValueError('interpolation order must be 0 to 3, got %s'%order)
+    data = np.asarray(data, dtype=float)
+    x = np.arange(data.shape[1], dtype=float) if x is None else np.asarray(x, dtype=float)
+    y = np.arange(data.shape[0], dtype=float) if y is None else np.asarray(y, dtype=float)
+    if xt is None or yt is None:
+        xg, yg = warp_grid(M, x, y)
+        xt = xg if xt is None else xt
+        yt = yg if yt is None else yt
+    xt = np.asarray(xt, dtype=float)
+    yt = np.asarray(yt, dtype=float)
+
+    coords = warp_coordinates(M, x, y, xt, yt)
+    nanmask = np.isnan(data)
+    if nanmask.any():
+        filled = np.where(nanmask, np.nanmean(data) if not nanmask.all() else 0., data)
+        res = map_coordinates(filled, coords, order=order, mode='constant', cval=np.nan)
+        bad = map_coordinates(nanmask.astype(float), coords, order=min(order, 1), mode='constant', cval=1.)
+        res[bad > 0] = np.nan
+    else:
+        res = map_coordinates(data, coords, order=order, mode='constant', cval=np.nan)
+    if not np.isnan(fill_value):
+        res[np.isnan(res)] = fill_value
+    return res, xt, yt
+
+def test_warp_data(nx=600, ny=400, ang=17., n=3):
+    """rotate a plane with non-square pixels and some nan, compare with the analytical result
+    and with rotation of points (`points_autoresample`). Warp is repeated `n` times
+    (coordinates from cache)."""
+    import time
+    from pySurf.points import matrix_to_points2, rotate_points, points_autoresample
+
+    x = np.linspace(-30, 30, nx)
+    y = np.linspace(-10, 10, ny)  # step is 0.05 in y, 0.1 in x
+    data = 2*x[None, :] - 3*y[:, None]
+    data[100:120, 200:230] = np.nan
+    center = (5., 2.)
+    M = rotation_matrix(ang, center)
+
+    t0 = time.time()
+    p = rotate_points(matrix_to_points2(data, x, y), ang/180*np.pi, center=center)
+    dp, xp, yp = points_autoresample(p)
+    t1 = time.time()
+    for i in range(n):
+        dw, xw, yw = warp_data(data, x, y, M)
+    t2 = time.time()
+
+    # expected: value at source position of each target node
+    Mi = np.linalg.inv(M)
+    X, Y = np.meshgrid(xw, yw)
+    xs = Mi[0, 0]*X + Mi[0, 1]*Y + Mi[0, 2]
+    ys = Mi[1, 0]*X + Mi[1, 1]*Y + Mi[1, 2]
+    expected = 2*xs - 3*ys
+    good = np.isfinite(dw)
+    print('points: %.3f s, warp: %.4f s per call, grid %i x %i'%(t1-t0, (t2-t1)/n, len(xw), len(yw)))
+    print('valid points: %i, max error: %g'%(good.sum(), np.abs(dw-expected)[good].max()))
+    assert np.abs(dw-expected)[good].max() < 1e-8
+    assert np.isnan(dw).sum() > np.isnan(data).sum()
+    return dw, xw, yw
@@ -15,6 +15,9 @@ from site import ENABLE_USER_SITE
 import matplotlib.pyplot as plt
 import numpy as np
 import warnings
+import functools
+import hashlib
+from collections import OrderedDict
 #from pySurf.points import *
 #from pySurf.psd2d import *
 from pyProfile.profile import polyfit_profile
@@ -25,6 +28,7 @@ from dataIO.span import span, span_from_pixels
 from dataIO.outliers import remove_outliers, EmptyRangeWarning
 from dataIO import outliers
 from dataIO.dicts import strip_kw,pop_kw
+from dataIO.cache import cached_reader
 import logging
 import os
 import pdb
@@ -36,6 +40,8 @@ from astropy.io import fits
 from pySurf.testSurfaces import make_prof_legendre, make_surf_legendre
 from pySurf.points import points_find_grid
 from pySurf.points import resample_grid
+from pySurf.grid_resample import resample_regular
+from pySurf.affine_warp import affine_matrix, rotation_matrix, warp_data
 
 from pySurf.points import points_in_poly, points_autoresample
 from plotting.add_clickable_markers import add_clickable_markers2
@@ -88,7 +94,36 @@ def removept(y):
     y=y-line (y)
     return y-np.nanmean(y)
 
-def level_by_line(data,function=None,axis=0,**kwargs):
+def remove_lines(data,axis=0,blocksize=None):
+    """Remove line through first and last valid (non-nan) points of each line along `axis`
+    (default vertical lines), vectorized equivalent of `y-pyProfile.profile.line(y)` on each line.
+    Huge maps can be processed in blocks of `blocksize` lines.
+    
+    2026/10/18 written to replace `np.apply_along_axis` in `level_by_line`."""
+
+    data=np.asarray(data)
+    ldata=np.empty(data.shape,dtype=np.result_type(data,float))
+    d=np.moveaxis(data,axis,0)
+    ld=np.moveaxis(ldata,axis,0)
+    n=d.shape[0]
+    nl=d.shape[1]
+    if blocksize is None: blocksize=nl
+    x=np.arange(n)[:,None]
+    for j in range(0,nl,blocksize):
+        y=d[:,j:j+blocksize]
+        valid=~np.isnan(y)
+        i0=np.argmax(valid,axis=0)
+        i1=n-1-np.argmax(valid[::-1],axis=0)
+        cols=np.arange(y.shape[1])
+        y0=y[i0,cols]
+        y1=y[i1,cols]
+        with np.errstate(invalid='ignore',divide='ignore'):
+            l=(x-i0)*(y1-y0)/(i1-i0)+y0
+        l[:,~valid.any(axis=0)]=0  # all nan lines are left nan
+        np.subtract(y,l,out=ld[:,j:j+blocksize])
+    return ldata
+
+def level_by_line(data,function=None,axis=0,blocksize=None,**kwargs):
     """Remove line through extremes line by line (along vertical lines).
     
     The returned array has 0 at the ends, but not necessarily zero mean.
@@ -96,14 +131,12 @@ def level_by_line(data,function=None,axis=0,**kwargs):
     Function is a function of profile vector y that returns a corrected profile.
 
     Completely useless, can be replaced by np.apply_along_axis or level_points.
+    2026/10/18 default line removal is vectorized (`remove_lines`), optionally in blocks of `blocksize` lines. `np.apply_along_axis` is used only if `function` is passed.
     """
     print ("level_by_line is completely useless function, use np.apply_along_axis or level_points.")
 
-    def remove_line(y): #default line removal function
-        return y-line(y)
-
     if function is None:
-        function=remove_line
+        return remove_lines(data,axis=axis,blocksize=blocksize)
 
     ldata=np.apply_along_axis( function, axis=axis, arr=data, **kwargs )
 
@@ -161,10 +194,9 @@ def fitlegendre(x,y=None,deg=None,nanstrict=False,fixnans=False):
         if not nanstrict:
             nancols=np.isin(np.arange(y.shape[-1]),goodind,invert=True) #boolean
             if nancols.any():
-                datarec=np.zeros((y.shape[0],y.shape[1]-len(goodind)))*np.nan
-                for i,col in enumerate(y[...,nancols].T):
-                    datarec[:,i]=fitlegendre(x,col,deg,fixnans=fixnans)
-                result[:,nancols]=datarec
+                # 2026/10/18 columns containing nans are fit all together with 
+                #   `fitlegendre_masked`, rather than one by one with `polyfit_profile`.
+                result[:,nancols]=fitlegendre_masked(x,y[:,nancols],deg)
             # recursively fit columns containing nans one by one to filter nans
             """
             nancols=np.isin(np.arange(y.shape[-1]),goodind,invert=True) #boolean
@@ -194,6 +226,133 @@ def fitlegendre(x,y=None,deg=None,nanstrict=False,fixnans=False):
     return result
 
 
+@functools.lru_cache(maxsize=32)
+def _legendre_basis(xkey,n,deg):
+    """Legendre Vandermonde matrix (n x deg+1) for coordinates in bytes `xkey`, 
+    mapped to [-1,1]. Cached to be reused on the same grid."""
+    x = np.frombuffer(xkey,dtype=float,count=n)
+    xmin,xmax = np.min(x),np.max(x)
+    xn = (x-xmin)/(xmax-xmin)*2-1 if xmax>xmin else np.zeros(n)
+    V = np.polynomial.legendre.legvander(xn,deg)
+    V.flags.writeable = False
+    return V
+
+def fitlegendre_masked(x,y,deg):
+    """Fit all columns of 2D `y` with legendre of degree `deg` on valid points only.
+    
+    Return fit of same shape as `y`, with nan on invalid points of `y`. 
+    Basis on `x` (coordinate of first axis) is calculated once and least square 
+    problems for all columns are solved together through normal equations 
+    with weights 0 on invalid points.
+    Columns with not enough valid points for a well-conditioned fit are fit 
+    one by one with `pyProfile.profile.polyfit_profile` (as done by `fitlegendre` on 1D data)."""
+    
+    x = np.ascontiguousarray(x,dtype=float)
+    V = _legendre_basis(x.tobytes(),len(x),deg)      # npoints x nterms
+    mask = np.isfinite(y)
+    w = mask.astype(float)
+    yw = np.where(mask,y,0)
+    
+    nterms = V.shape[1]
+    VV = (V[:,:,None]*V[:,None,:]).reshape(len(x),nterms**2)
+    G = (w.T @ VV).reshape(-1,nterms,nterms)   # ncols x nterms x nterms
+    b = (V.T @ yw).T                       # ncols x nterms
+    result = np.full(y.shape,np.nan)
+    
+    nvalid = mask.sum(axis=0)
+    good = nvalid > deg
+    # ill-conditioned (e.g. valid points on a small part of the range) are fit one by one
+    good[good] = np.linalg.cond(G[good]) < 1e8
+    if good.any():
+        coeff = np.linalg.solve(G[good],b[good][...,None])[...,0]
+        result[:,good] = V @ coeff.T
+    for i in np.where(~good)[0]:
+        result[:,i] = polyfit_profile(x,y[:,i],degree=deg)
+    result[~mask] = np.nan
+    return result
+
+# cache for `fitlegendre2d`, {key: (x basis, y basis, pseudo-inverse of normal matrix)}
+_legendre2d_cache = OrderedDict()
+LEGENDRE2D_CACHE_SIZE = 16
+
+def _legendre2d_solver(x,y,xl,yl,mask):
+    """return legendre bases on `x` and `y` (columns `xl`, `yl`) and pseudo-inverse
+    of normal matrix for points in `mask`, from cache if already calculated
+    for same grid, terms and mask."""
+    
+    key = (hashlib.sha1(x.tobytes()).hexdigest(),hashlib.sha1(y.tobytes()).hexdigest(),
+           tuple(xl),tuple(yl),hashlib.sha1(np.packbits(mask).tobytes()).hexdigest())
+    if key in _legendre2d_cache:
+        _legendre2d_cache.move_to_end(key)
+        return _legendre2d_cache[key]
+    
+    lx = _legendre_basis(x.tobytes(),len(x),max(xl))[:,xl]  # nx x nterms
+    ly = _legendre_basis(y.tobytes(),len(y),max(yl))[:,yl]  # ny x nterms
+    nterms = len(xl)
+    # G[k,l] = sum over valid points of (ly_k ly_l)(lx_k lx_l)
+    lxx = (lx[:,:,None]*lx[:,None,:]).reshape(len(x),nterms**2)
+    lyy = (ly[:,:,None]*ly[:,None,:]).reshape(len(y),nterms**2)
+    G = np.sum((lyy.T @ mask) * lxx.T, axis=1).reshape(nterms,nterms)
+    result = (lx,ly,np.linalg.pinv(G))
+    
+    _legendre2d_cache[key] = result
+    if len(_legendre2d_cache) > LEGENDRE2D_CACHE_SIZE:
+        _legendre2d_cache.popitem(last=False)
+    return result
+
+def legendre_terms(degree):
+    """return degrees in x and y `xl`, `yl` of 2D legendre terms for `degree`, as used in `level_data`.
+    
+    A scalar `degree` is a total degree (terms with `xl + yl <= degree`), a 2-element
+    `degree` gives all terms up to degree `xo` in x and `yo` in y."""
+    
+    if np.size(degree)==1:
+        #this is enough to include everything
+        xo=degree
+        yo=degree
+    else:
+        xo,yo=degree 
+    
+    xl,yl = [f.flatten() for f in np.meshgrid(np.arange(xo+2),np.arange(yo+1))]
+    
+    if np.size(degree)==1:
+        #select use < (not <=) because I want to exclude
+        sel = [xxl + yyl <= degree for xxl,yyl in zip(xl,yl)]
+        if np.where(sel)[0].size == 0: #avoid emptying arrays if degree is 0
+            raise ValueError('someting wrong with degree settings!')
+        # make xl, yl
+        xl, yl = xl[sel],yl[sel]        
+    
+    #list(zip(*[f.flatten() for f in np.meshgrid(np.arange(xo+1),np.arange(yo+1))]))
+    #[(0, 0), (1, 0), (0, 1), (1, 1)] #xo=1,yo=1
+    return xl,yl
+
+def fitlegendre2d(data,x=None,y=None,xo=2,yo=2,xl=None,yl=None):
+    """Fit a 2D legendre surface to valid points of `data`, return fit (on full grid) and coefficients.
+    
+    Terms are products of legendre polynomials of degree `xl[i]` in x and `yl[i]` in y,
+    if not provided, all terms up to degree `xo` and `yo` are used.
+    Coordinates are mapped to [-1,1], coefficients are in order of terms.
+    Bases and least square solution for same grid, terms and invalid points are
+    cached and reused (up to `LEGENDRE2D_CACHE_SIZE` combinations).
+    Replaces `utilities.imaging.fitting.legendre2d`, 2026/10/18.
+    """
+    
+    ny,nx = data.shape
+    x = np.ascontiguousarray(np.arange(nx) if x is None else x,dtype=float)
+    y = np.ascontiguousarray(np.arange(ny) if y is None else y,dtype=float)
+    if xl is None or yl is None:
+        xl,yl = [f.flatten() for f in np.meshgrid(np.arange(xo+1),np.arange(yo+1))]
+    xl,yl = np.asarray(xl,dtype=int),np.asarray(yl,dtype=int)
+    
+    mask = np.isfinite(data)
+    lx,ly,Ginv = _legendre2d_solver(x,y,xl,yl,mask)
+    d0 = np.where(mask,data,0)
+    b = (ly.T @ d0 @ lx).diagonal()   # b[k] = sum of ly_k * d0 * lx_k
+    coeff = Ginv @ b
+    fit = (ly*coeff) @ lx.T
+    return fit,coeff
+
 def levellegendre(x,y,deg,nanstrict=False):
     """Remove degree polyomial by line.
     
@@ -219,8 +378,9 @@ def level_data(data,x=None,y=None,degree=1,axis=None,byline=False,fit=False,*arg
     leveling by line (controlled by axis keyword) also hondle nans.
     x and y are not used, but maintained for interface consistency.
     fit=True returns fit component instead of residuals
+    2026/10/18 plane level uses `fitlegendre2d` instead of `utilities.imaging.fitting.legendre2d`,
+      extra `args` and `kwargs` are accepted only for leveling by line.
     """
-    from utilities.imaging.fitting import legendre2d
 
     if x is None:  x = np.arange(data.shape[1])
     if y is None:  y = np.arange(data.shape[0])
@@ -236,27 +396,10 @@ def level_data(data,x=None,y=None,degree=1,axis=None,byline=False,fit=False,*arg
         leg = level_data(data.T,y,x,degree,axis=0,fit=True,*args,**kwargs)[0].T
     elif axis is None: #plane level   
         
-        if np.size(degree)==1:
-            #this is enough to include everything
-            xo=degree
-            yo=degree
-        else:
-            xo,yo=degree 
-        
-        xl,yl = [f.flatten() for f in np.meshgrid(np.arange(xo+2),np.arange(yo+1))]
-        
-        if np.size(degree)==1:
-            #select use < (not <=) because I want to exclude
-            sel = [xxl + yyl <= degree for xxl,yyl in zip(xl,yl)]
-            if np.where(sel)[0].size == 0: #avoid emptying arrays if degree is 0
-                raise ValueError('someting wrong with degree settings!')
-            # make xl, yl
-            xl, yl = xl[sel],yl[sel]        
-        
-        #list(zip(*[f.flatten() for f in np.meshgrid(np.arange(xo+1),np.arange(yo+1))]))
-        #[(0, 0), (1, 0), (0, 1), (1, 1)] #xo=1,yo=1
-
-        leg=legendre2d(data,x,y,xl=xl,yl=yl,*args,**kwargs)[0] #legendre2d(d, xo=2, yo=2, xl=None, yl=None)
+        if args or kwargs:
+            raise ValueError("plane leveling (axis=None) doesn't accept extra arguments (were passed to `legendre2d`): %s %s"%(args,kwargs))
+        xl,yl = legendre_terms(degree)
+        leg=fitlegendre2d(data,x,y,xl=xl,yl=yl)[0] #legendre2d(d, xo=2, yo=2, xl=None, yl=None)
     
     return (leg if fit else data-leg),x,y #fails with byline 
     #return (leg[0] if fit else data-leg[0]),x,y
@@ -272,17 +415,29 @@ def transpose_data(data,x,y):
     x,y=y,x
     return data,x,y
 
-def apply_transform(data,x,y,trans=None):
+def apply_transform(data,x,y,trans=None,order=1,xout=None,yout=None):
     """Apply a 3D transformation (from Nx3 to Nx3) to data.
     
+    2026/10/18 if `trans` is affine in x,y and leaves z unchanged (e.g. from `affine2D.find_affine`),
+    data are warped on grid `xout`, `yout` (default: covering transformed data with same steps)
+    with interpolation of `order` 0 to 3 (see `affine_warp.warp_data`), otherwise
+    points are transformed and resampled.
+    
     TODO: add option to set final resampling grid keeping initial sampling, 
     initial number of points or on custom grid (use points.resample_grid, resample_data).
     """
     from pySurf.points import matrix_to_points2,points_autoresample
+    from pySurf.grid_index import points_to_matrix
 
     if trans is not None:
+        M=affine_matrix(trans,x,y)
+        if M is not None:
+            return warp_data(data,x,y,M,xout,yout,order=order)
         p2=trans(matrix_to_points2(data,x,y))
-        data,x,y=points_autoresample(p2)
+        try:  #2026/10/18 xy still on grid nodes (e.g. transformation of z only), no resampling
+            data=points_to_matrix(p2,xgrid=x,ygrid=y)[0]
+        except ValueError:
+            data,x,y=points_autoresample(p2)
 
     return data,x,y
 
@@ -290,7 +445,6 @@ def rotate_data(data,x=None,y=None,ang=0,k=None,center=None,
     fill_value=np.nan,usepoints=False,*args,**kwargs):
     """Rotate anticlockwise by an angle in degree.
     
-    Non optimized version using points functions.
     2018/10/31 added k parameters allowing 90 deg rotations with np.rot90. 
     k is the number of anticlockwise rotations about center. 
     Note there is not resampling, so it can be inaccurate if center is not 
@@ -305,6 +459,14 @@ def rotate_data(data,x=None,y=None,ang=0,k=None,center=None,
     rot90 determination of rotated axis can probably be extended to general case, but in the meanwhile
     the implementation based on points offers an accurate interpolation (even if slower),
       can be enabled setting flag `usepoints`.
+
+    2026/10/18 general angle uses `affine_warp.warp_data` instead of `ndimage.rotate`:
+      result is on a grid covering rotated data with same steps, nan outside data,
+      interpolation is cubic by default (`order=3`, as in `ndimage.rotate`), data are rotated
+      about `center` (same default as for `k`). Keywords of `ndimage.rotate` are mapped: `order` and `cval` (as `fill_value`) are used,
+      `reshape=False` returns data on the original grid `x`, `y`, `mode`, `prefilter`, `output` 
+      and `axes` are ignored with a warning, as are extra positional args.
+      Other keywords are passed to `warp_data` (e.g. `xt`, `yt` for the output grid).
     """
     #establish data coordinates if not provided
     if x is None:
@@ -355,30 +517,20 @@ def rotate_data(data,x=None,y=None,ang=0,k=None,center=None,
         #x,y=-y,x
         #return data,x,y
 
-    # use ndimage to rotate data and recalculate coordinate
-    #this assumes same center and non-integer coordinates are interpolated on integer cordinates
-    #   (in units of steps)
-    # default cval = 0.0
-    a3=ndimage.rotate(data,ang,reshape=1,cval=fill_value,*args,**kwargs)
-    x3=np.arange(a3.shape[1],dtype=float)*step[0]
-    y3=np.arange(a3.shape[0],dtype=float)*step[1]
-
-    #this is center of integer indices of rotated data, different from float center
-    #  of rotated corner span (can be calculated with matrix, see ipynb notebook
-    corners3=list(itertools.product((x3[0],x3[-1]),(y3[0],y3[-1])))
-    xc3,yc3=span(corners3,axis=0).mean(axis=0)
-
-    th=ang/180*np.pi
-    #rotate distance vector of rotation center from scipy center
-    x0,y0=np.matmul(([[np.cos(th),np.sin(th)],[-np.sin(th),np.cos(th)]]),(np.array([xc,yc])-center)).T
-    #x0,y0=rotate_points((np.array([xc,yc])-center),ang*np.pi/180.,center=center) #rotation center transformed using points
-
-    #x0+xc is center of rotated corners
-    xout=x3-(xc3)+x0+center[0]  #(x3-xc3)*step[0]+center[0]
-    yout=y3-(yc3)+y0+center[1] #(y3-yc3)*step[1]+center[1]
-
-
-    return a3,xout,yout
+    #2026/10/18 general angle: affine warp in axis coordinates (works also with non-square pixels),
+    #   previously `ndimage.rotate` on indices.
+    if args:
+        print("WARNING: positional arguments to rotate_data are ignored (were passed to `ndimage.rotate`): ",args)
+    if not kwargs.pop('reshape',True):
+        kwargs.setdefault('xt',x)
+        kwargs.setdefault('yt',y)
+    if 'cval' in kwargs:
+        fill_value=kwargs.pop('cval')
+    ignored={k:kwargs.pop(k) for k in ('mode','prefilter','output','axes') if k in kwargs}
+    if ignored:
+        print("WARNING: `ndimage.rotate` arguments are ignored by rotate_data: ",ignored)
+    kwargs.setdefault('order',3)
+    return warp_data(data,x,y,rotation_matrix(ang,center),fill_value=fill_value,**kwargs)
 
 
 def save_data(filename,data,x=None,y=None,fill_value=np.nan,addaxis=True,makedirs=False,**kwargs):
@@ -662,6 +814,7 @@ def get_data(*args,**kwargs):
     print ('this routine was replaced by `data_from_txt`, update code')
     return data_from_txt(*args,**kwargs)
 
+@cached_reader
 def data_from_txt(filename,x=None,y=None,xrange=None,yrange=None,matrix=False,
     addaxis=False,center=None,skip_header=None,delimiter=' ',strip=False,**kwargs):
     """Read matrix from text file. Return data,x,y.
@@ -685,6 +838,8 @@ def data_from_txt(filename,x=None,y=None,xrange=None,yrange=None,matrix=False,
         For example, makes it fail when called by instrument_reader.read_data with header=True,
         because even if the function doesn't expect a header keyword, the caller routine doesn't
         detect the error. Solution is to make the calling routine check for undefined values?
+    
+    Results can be cached on disk with `cache=True` (see `dataIO.cache`).
     """
     #pdb.set_trace()
     #2014/04/29 added x and y as preferred arguments to xrange and yrange (to be removed).
@@ -720,6 +875,11 @@ def resample_data(d1,d2,method='mc',onfirst=False):
     d1 and d2 are passed as list of data,x,y.
     Return a [Nx x Ny] data.
     onfirst allow to resample second array on first (same as swapping args).
+    method 'gd' (originally `griddata`, linear) uses bilinear interpolation on the source grid
+    (`pySurf.grid_resample.resample_regular`, weights are cached for repeated grids),
+    it is linear only as it was with `griddata`, for cubic interpolation on grid use 
+    `resample_regular` with `method='cubic'`.
+    'mc' `map_coordinates` (extrapolates at edges).
     To get a (plottable) matrix of data use:
     plt.imshow(rpoints[:,2].reshape(ygrid.size,xgrid.size)).
     """
@@ -752,8 +912,11 @@ def resample_data(d1,d2,method='mc',onfirst=False):
 
     #data2,x2,y2=d2
     if method=='gd':   #use griddata from scipy.interpolate
-        z=ip.griddata(np.array(np.meshgrid(x1,y1)).reshape(2,-1).T,data1.flatten(),np.array(np.meshgrid(x2,y2)).reshape(2,-1).T) #there must be an easier way
-        z.reshape(-1,len(x2))
+        try:
+            z=resample_regular(data1,x1,y1,x2,y2)  #separable on source grid, same result for linear data
+        except ValueError:  #axes not monotonic
+            z=ip.griddata(np.array(np.meshgrid(x1,y1)).reshape(2,-1).T,data1.flatten(),np.array(np.meshgrid(x2,y2)).reshape(2,-1).T) #there must be an easier way
+            z=z.reshape(-1,len(x2))
 
         #old not working z=ip.griddata(np.meshgrid(x1,y1),data1,(x2,y2),method='linear') #this is super slow,
     elif method == 'mc':  #map_coordinates
@@ -995,6 +1158,68 @@ def matrix_project(data,axis=1):
     #return np.nanmin(data,axis=axis),np.nanmean(data,axis=axis),np.nanmax(data,axis=axis)
     return projection(data,span=True,axis=axis)
 
+def _profile_positions(path,npoints):
+    """return x, y of `npoints` equally spaced (along the line) points on polyline `path` [Nvertices x 2]
+    and distance from first vertex."""
+    path=np.asarray(path,dtype=float)
+    s=np.concatenate([[0],np.cumsum(np.sqrt(np.sum(np.diff(path,axis=0)**2,axis=1)))])
+    r=np.linspace(0,s[-1],npoints)
+    if s[-1]==0:  #all vertices coincide
+        return np.full(npoints,path[0,0]),np.full(npoints,path[0,1]),r
+    return np.interp(r,s,path[:,0]),np.interp(r,s,path[:,1]),r
+
+def _grid_index(v,grid):
+    """fractional index of coordinates `v` on monotonic axis `grid`, nan outside."""
+    grid=np.asarray(grid,dtype=float)
+    i=np.arange(len(grid),dtype=float)
+    if grid[-1]<grid[0]:
+        grid,i=grid[::-1],i[::-1]
+    return np.interp(v,grid,i,left=np.nan,right=np.nan)
+
+def extract_profiles(data,x=None,y=None,paths=None,npoints=None,order=1,along=True):
+    """extract profiles along a list of polylines from gridded data, evaluating all points with a single
+    `scipy.ndimage.map_coordinates` call.
+
+    `paths` is a list of polylines, each one a sequence of (x,y) vertices (e.g. [[x0,y0],[x1,y1]] for a segment).
+    Each profile has `npoints` points equally spaced along its polyline, if None it is set to the largest
+    number of grid steps spanned by a profile (plus one).
+    `order` is the spline order of interpolation (1 is bilinear). Points outside the grid, or with a nan among
+    the nearest grid nodes, are nan (nan are replaced by mean of data before spline interpolation, so
+    values close to nan are approximate for `order` > 1).
+    Return stacked arrays [Nprofiles x npoints]: distance along profile and z if `along` is set
+    (default), otherwise x, y and z.
+
+    2026/10/18 replaces profile by profile interpolation of points with `griddata`."""
+
+    if x is None: x=np.arange(data.shape[1],dtype=float)
+    if y is None: y=np.arange(data.shape[0],dtype=float)
+    paths=[np.asarray(p,dtype=float).reshape(-1,2) for p in paths]
+
+    if npoints is None:
+        step=np.abs([x[1]-x[0] if len(x)>1 else 1.,y[1]-y[0] if len(y)>1 else 1.])
+        npoints=int(max(np.ceil(np.max(np.sum(np.abs(np.diff(p,axis=0)),axis=0)/step)) for p in paths))+1
+    xx,yy,rr=(np.array(v) for v in zip(*[_profile_positions(p,npoints) for p in paths]))
+
+    ix=_grid_index(xx,x)
+    iy=_grid_index(yy,y)
+    outside=np.isnan(ix)|np.isnan(iy)
+    coords=np.array([np.where(outside,0,iy).ravel(),np.where(outside,0,ix).ravel()])
+
+    nanmask=np.isnan(data)
+    if nanmask.any():
+        zdata=np.where(nanmask,np.nanmean(data) if not nanmask.all() else 0.,data)
+        near=map_coordinates(nanmask.astype(float),coords,order=1,mode='nearest')>0
+    else:
+        zdata=data
+        near=np.zeros(coords.shape[1],dtype=bool)
+    z=map_coordinates(np.asarray(zdata,dtype=float),coords,order=order,mode='nearest')
+    z[near|outside.ravel()]=np.nan
+    z=z.reshape(xx.shape)
+
+    if along:
+        return rr,z
+    return xx,yy,z
+
 
 def calculate_slope_2D(wdata,x,y,scale=(1.,1.,1.)):
     """calculate slope maps in x and y.
@@ -1293,9 +1518,9 @@ def plot_data(data,x=None,y=None,title=None,outfile=None,units=None,stats=False,
         #with warnings.catch_warnings(record=True) as w:  
 
         if isinstance(nsigma,dict): #if more than one option were passed
-            clim=span(np.where(remove_outliers(data,**nsigma),data,np.nan))
+            clim=outliers.clipped_span(data,**nsigma)
         else:
-            clim=span(np.where(remove_outliers(data,nsigma=nsigma),data,np.nan))
+            clim=outliers.clipped_span(data,nsigma=nsigma)
 
         if len(clim)==0: 
             print('Range after filtering was empty, plotting full set of data.')
@@ -1522,11 +1747,7 @@ def test_plot_stats(value=None):
 def psf2d(y,wdata,alpha,xout,nskip=1):
     """return a 2d psf for axial profiles on wdata with coordinate y.
     """
-    psf2d=[]
-    for col in wdata[:,::nskip].T:
-        yout=PSF_spizzichino(y,col/1000.,alpha=alpha,xout=xout)[1]
-        psf2d.append(yout)
-    return np.array(psf2d).T
+    return PSF_spizzichino(y,wdata[:,::nskip]/1000.,alpha=alpha,xout=xout)[1]
     #return xout*206265.,np.array(yout)
 
 def compare_2images(data,ldata,x=None,y=None,fignum=None,titles=None,vmin=None,vmax=None,
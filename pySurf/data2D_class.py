@@ -1,3 +1,4 @@
+import inspect
 import os
 import pdb
 from copy import deepcopy
@@ -15,13 +16,14 @@ from pySurf import data2D, points
 from pySurf.affine2D import find_affine
 from pySurf.data2D import apply_transform as apply_transform_data
 from pySurf.data2D import (crop_data, data_from_txt, data_histostats,
+                           fitlegendre, fitlegendre2d, legendre_terms,
                            level_data, plot_data, projection, read_data,
                            register_data, resample_data, rotate_data,
                            save_data, slope_2D, subtract_data, sum_data,
                            transpose_data)
-from pySurf.points import matrix_to_points2, points_autoresample
+from pySurf.points import grid_to_points, matrix_to_points2, points_autoresample
 from pySurf.psd2d import (plot_psd2d, plot_rms_power, psd2d, psd2d_analysis,
-                          rms_power)
+                          psd2d_stack, rms_power, rms_power_bands)
 from pySurf.readers.format_reader import auto_reader
 
 """
@@ -615,9 +617,9 @@ class Data2D(object):  # np.ndarrays
 
     remove_nan_frame = update_docstring(remove_nan_frame, data2D.remove_nan_frame)
 
-    def topoints(self):
-        """convenience function to get points using matrix_to_points2."""
-        return matrix_to_points2(self.data, self.x, self.y)
+    def topoints(self, dropnan=False):
+        """convenience function to get points using matrix_to_points2 (excluding invalid data if `dropnan` is set)."""
+        return matrix_to_points2(self.data, self.x, self.y, dropnan=dropnan)
 
     def std(self, axis=None):
         """return standard deviation of data excluding nans"""
@@ -652,23 +654,53 @@ class Data2D(object):  # np.ndarrays
 
     def remove_outliers(self, fill_value=np.nan, mask=False, *args, **kwargs):
         """use dataIO.remove_outliers to remove outliers from data. return a new Data2D object with outliers replaced by `fill_value`. If `mask` is set returns mask (easier than extracting it from returned object)."""
-        res = self.copy()
-        m = remove_outliers(res.data, *args, **kwargs)  # boolean mask
+        m = remove_outliers(self.data, *args, **kwargs)  # boolean mask
         # pdb.set_trace()
         if mask:
             return m
+        res = self.copy()
         res.data[~m] = fill_value
         return res
 
     remove_outliers = update_docstring(remove_outliers, dataIO.outliers.remove_outliers)
 
-    def extract_profile(self, *args, **kwargs):
-        p = self.topoints()
-        prof = points.extract_profile(p, *args, **kwargs)
-        return prof
+    def extract_profile(self, *args, order=None, **kwargs):
+        """If `order` is set, profiles are interpolated on grid with spline of `order`
+        (see `data2D.extract_profiles`) instead of `griddata` on points, with same arguments 
+        and return format (with `plot` points are always used).
+        2026/10/18 added `order`."""
+        if order is None or kwargs.get('plot', False):
+            return points.extract_profile(self.topoints(), *args, **kwargs)
+        a = inspect.signature(points.extract_profile).bind(None, *args, **kwargs)
+        a.apply_defaults()
+        xy0, xy1, npoints, along = [a.arguments[k] for k in ('xy0', 'xy1', 'npoints', 'along')]
+        if xy1 is None:
+            if len(np.shape(xy0)) == 1:  # single point
+                return data2D.extract_profiles(self.data, self.x, self.y, [[xy0, xy0]], npoints=1, order=order)[-1][0, 0]
+            # each profile has its own number of points, as in `points.extract_profile`
+            return [self.extract_profile(p[0], p[1], npoints=npoints, along=along, order=order) for p in xy0]
+        if npoints is None:  # same default as `points.extract_profile`: grid nodes spanned, plus one per side
+            npoints = 0
+            for v, a0, a1 in ((self.x, xy0[0], xy1[0]), (self.y, xy0[1], xy1[1])):
+                i = np.where((v >= min(a0, a1)) & (v <= max(a0, a1)))[0]
+                if len(i) == 0:
+                    i = [np.abs(v - (a0 + a1)/2.).argmin()]
+                npoints = max(npoints, len(i) + (i[0] != 0) + (i[-1] != len(v) - 1))
+        res = data2D.extract_profiles(self.data, self.x, self.y, [[xy0, xy1]], npoints=npoints, order=order, along=along)
+        return [v[0] for v in res]
 
     extract_profile = update_docstring(extract_profile, points.extract_profile)
 
+    def extract_profiles(self, paths, npoints=None, order=1, along=True):
+        """extract profiles along a list of polylines `paths` (each a sequence of (x, y) vertices), 
+        all with `npoints` points, interpolating data on grid with spline of `order` 
+        (see `pySurf.data2D.extract_profiles`).
+        Return stacked arrays [Nprofiles x npoints]: distance along profile and z if `along` is set
+        (default), otherwise x, y and z.
+        Faster than `extract_profile` for many profiles, that returns a list.
+        2026/10/18"""
+        return data2D.extract_profiles(self.data, self.x, self.y, paths, npoints=npoints, order=order, along=along)
+
     def histostats(self, *args, **kwargs):
         res = data_histostats(
             self.data, self.x, self.y, units=self.units, *args, **kwargs
@@ -733,7 +765,9 @@ class PSD2D(Data2D):
 
     def rms_power(self, plot=False, rmsrange=None, *args, **kwargs):
         """Calculate rms slice power by integrating .
-        If plot is set also plot the whole thing."""
+        If plot is set also plot the whole thing.
+        `rmsrange` can be a single range [fmin, fmax] or a list of ranges,
+        in this case an array (nranges, nx) is returned (see `pySurf.psd2d.rms_power_bands`)."""
 
         # pdb.set_trace()
         if plot:
@@ -748,14 +782,162 @@ class PSD2D(Data2D):
             )
         else:
             """this is obtained originally by calling rms_power, however the function deals with only scalar input for rms range.
-            Part dealing with multiple ranges is in plot_rms_power, but should be moved to rms_power."""
+            Multiple ranges are calculated together with rms_power_bands."""
             if rmsrange is not None:
-                if np.size(rmsrange) != 2:
-                    raise NotImplementedError
+                if np.size(rmsrange) != 2 or np.size(rmsrange[0]) != 1:
+                    return rms_power_bands(self.y, self.data, rmsrange)
 
             return rms_power(self.y, self.data, rmsrange=rmsrange, *args, **kwargs)
 
 
+class DataStack(object):
+    """N Data2D objects with same x and y, stored in a single (N, ny, nx) array.
+
+    Operations over the stack are vectorized on the first axis.
+    Can be created from a Dlist with `DataStack.from_dlist(dlist)` or `dlist.tostack()`,
+    converted back with `todlist`. Elements can be accessed as Data2D by index."""
+
+    def __init__(self, data, x=None, y=None, units=None, names=None):
+        """`data` is a (N, ny, nx) array or a list of N 2D arrays of same shape.
+        `x`, `y`, `units` are in common to all elements, `names` is a list of N names."""
+
+        self.data = np.asarray(data)
+        if self.data.ndim != 3:
+            raise ValueError("data must be 3D (N, ny, nx), shape is %s" % (self.data.shape,))
+        n, ny, nx = self.data.shape
+        self.x = np.arange(nx) if x is None else np.asarray(x)
+        self.y = np.arange(ny) if y is None else np.asarray(y)
+        if len(self.x) != nx or len(self.y) != ny:
+            raise ValueError("size of x (%i) and y (%i) don't match data (nx=%i, ny=%i)" % (len(self.x), len(self.y), nx, ny))
+        self.units = units
+        self.names = ['']*n if names is None else list(names)
+
+    @classmethod
+    def from_dlist(cls, dlist, rtol=1e-9, atol=0):
+        """create a DataStack from a list of Data2D, raise ValueError if x and y
+        are not the same within tolerances `rtol` and `atol` (see `np.allclose`)."""
+
+        if len(dlist) == 0:
+            raise ValueError("can't create a DataStack from an empty list")
+        d0 = dlist[0]
+        for d in dlist[1:]:
+            if (d.data.shape != d0.data.shape or
+                not np.allclose(d.x, d0.x, rtol=rtol, atol=atol) or
+                not np.allclose(d.y, d0.y, rtol=rtol, atol=atol)):
+                raise ValueError("all data in DataStack must have same x and y, "
+                    "'%s' differs from '%s' (use resample)." % (d.name, d0.name))
+            if d.units != d0.units:
+                print("WARNING: different units in DataStack (%s and %s), using %s" % (d0.units, d.units, d0.units))
+        data = np.empty((len(dlist),) + d0.data.shape, dtype=np.result_type(*[d.data for d in dlist]))
+        for i, d in enumerate(dlist):
+            data[i] = d.data
+        return cls(data, d0.x.copy(), d0.y.copy(), units=d0.units, names=[d.name for d in dlist])
+
+    def todlist(self):
+        """return a Dlist of Data2D objects (with copies of data)."""
+        from pySurf.scripts.dlist import Dlist  # dlist imports this module
+
+        return Dlist([self[i] for i in range(len(self))])
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    def __getitem__(self, i):
+        """return element `i` as Data2D (with a copy of data), or a DataStack if `i` is a slice or list."""
+        if np.ndim(i) == 0 and not isinstance(i, slice):
+            return Data2D(self.data[i].copy(), self.x.copy(), self.y.copy(),
+                          units=self.units, name=self.names[i])
+        ind = np.arange(len(self))[i]
+        return DataStack(self.data[ind], self.x, self.y, units=self.units,
+                         names=[self.names[j] for j in ind])
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def __repr__(self):
+        return "<DataStack of %i data (%i x %i)>" % (self.data.shape[0], self.data.shape[2], self.data.shape[1])
+
+    def _tomap(self, data, name):
+        return Data2D(data, self.x.copy(), self.y.copy(), units=self.units, name=name)
+
+    def mean(self):
+        """return Data2D with mean of data over the stack, excluding nans."""
+        return self._tomap(np.nanmean(self.data,axis=0),'mean')
+
+    def std(self):
+        """return Data2D with standard deviation of data over the stack, excluding nans."""
+        return self._tomap(np.nanstd(self.data,axis=0),'std')
+
+    def median(self):
+        """return Data2D with median of data over the stack, excluding nans."""
+        return self._tomap(np.nanmedian(self.data,axis=0),'median')
+
+    def differences(self, level=False, *args, **kwargs):
+        """return a DataStack with differences `d[j] - d[i]` for all couples i < j
+        (same order as `itertools.combinations`).
+        If `level` is True, differences are leveled with `DataStack.level(*args, **kwargs)`."""
+        i, j = np.triu_indices(len(self), 1)
+        res = DataStack(self.data[j]-self.data[i], self.x, self.y, units=self.units,
+            names=[self.names[jj]+' - '+self.names[ii] for ii,jj in zip(i,j)])
+        return res.level(*args, **kwargs) if level else res
+
+    def level(self, degree=1, axis=None, fit=False):
+        """level each element of the stack, return a new DataStack.
+
+        `degree` and `axis` have same meaning as in `pySurf.data2D.level_data`,
+        `fit=True` returns fit component instead of residuals.
+        With `axis=None`, a 2D legendre surface is fit on valid points of each element
+        (elements with same invalid points are fit together), with
+        `axis` 0 or 1 vertical or horizontal lines of all elements are fit together."""
+
+        n, ny, nx = self.data.shape
+        if axis == 0:
+            d = np.moveaxis(self.data, 0, 1).reshape(ny, n*nx)
+            leg = fitlegendre(self.y, d, degree)
+            leg = np.moveaxis(leg.reshape(ny, n, nx), 1, 0)
+        elif axis == 1:
+            d = np.moveaxis(self.data, 2, 0).reshape(nx, n*ny)
+            leg = fitlegendre(self.x, d, degree)
+            leg = np.moveaxis(leg.reshape(nx, n, ny), 0, 2)
+        elif axis is None:
+            leg = self._legendre_fit(degree)
+        else:
+            raise ValueError("axis must be 0, 1 or None: %s" % axis)
+
+        res = DataStack(leg if fit else self.data-leg, self.x, self.y, units=self.units, names=self.names)
+        return res
+
+    def _legendre_fit(self, degree):
+        """fit of 2D legendre polynomials to each element of the stack with `pySurf.data2D.fitlegendre2d`,
+        terms are selected from `degree` as in `pySurf.data2D.level_data`. Least square solution is
+        cached by `fitlegendre2d` and reused for elements with same invalid points."""
+
+        xl, yl = legendre_terms(degree)
+        n, ny, nx = self.data.shape
+        leg = np.full((n, ny, nx), np.nan)
+        for i, d in enumerate(self.data):
+            if np.count_nonzero(np.isfinite(d)) < len(xl):
+                continue  # not enough points, fit is nan
+            leg[i] = fitlegendre2d(d, self.x, self.y, xl=xl, yl=yl)[0]
+        return leg
+
+    def topoints(self):
+        """convert stack to a single set of points (as `Dlist.topoints`),
+        coordinates are broadcast from the axes as in `pySurf.points.grid_to_points`."""
+        return grid_to_points(self.data, self.x, self.y)
+
+    def psd(self, chunksize=None, dtype=None, **kwargs):
+        """return a DataStack with 2d psds of all elements, calculated together
+        with `pySurf.psd2d.psd2d_stack` (see for arguments).
+        The frequency axis is stored as y."""
+        f, p, avg = psd2d_stack(self.data, self.x, self.y, chunksize=chunksize, dtype=dtype, **kwargs)
+        return DataStack(p, self.x, f, units=self.units, names=self.names)
+
+    def plot(self, *args, **kwargs):
+        """plot all elements (see `plot_data`)."""
+        return self.todlist().plot(*args, **kwargs)
+
+
 def test_rot90():
     a = np.ones(250).reshape((25, 10))
     a[6:7, 6:9] = 3
@@ -0,0 +1,182 @@
+"""Detection of the grid of a point cloud [Npoints x 3] in any order.
+
+Coordinates on each axis are sorted once and clustered: values closer than a tolerance
+belong to the same grid line, so that slightly jittered clouds (e.g. from stage positions
+or rounding after transformations) are recognized. Each point gets integer indices (i, j)
+of its grid node, and clouds aligned on a lattice can be scattered directly in a matrix.
+Cost is O(N log N), dominated by sorting.
+
+2026/10/18 written as robust alternative to `points.points_find_grid`, which estimates
+the grid from first points and fails on unsorted clouds.
+"""
+
+import numpy as np
+
+def gap_tolerance(gaps, ratio=10.):
+    """return tolerance for clustering coordinates with distances `gaps` between
+    consecutive sorted values.
+
+    Nonzero gaps are split in two groups (small ones inside grid lines, large ones
+    between lines) at the largest ratio between consecutive sorted gaps.
+    The split is accepted only if this ratio is at least `ratio`, otherwise tolerance
+    is 0 (only equal values are merged)."""
+
+    g = np.sort(gaps[gaps > 0])
+    if g.size < 2:
+        return 0.
+    r = g[1:]/g[:-1]
+    ks = np.argmax(r)
+    if r[ks] < ratio:
+        return 0.
+    return np.sqrt(g[ks]*g[ks+1])
+
+def cluster_coordinates(v, tol=None):
+    """cluster values of 1D array `v` in groups of consecutive (after sorting) values with
+    distance not larger than `tol` (determined by `gap_tolerance` if None).
+    Return ascending centers (average of each group) and index of group for each element of `v`."""
+
+    v = np.asarray(v, dtype=float)
+    order = np.argsort(v, kind='stable')
+    vs = v[order]
+    gaps = np.diff(vs)
+    if tol is None:
+        tol = gap_tolerance(gaps)
+    new = np.empty(v.size, dtype=bool)
+    new[:1] = True
+    new[1:] = gaps > tol
+    ids = np.cumsum(new) - 1
+    index = np.empty(v.size, dtype=np.intp)
+    index[order] = ids
+    centers = np.bincount(ids, weights=vs)/np.bincount(ids)
+    return centers, index
+
+def points_grid_index(points, tol=None):
+    """find grid of `points` [Npoints x 2 or 3] in any order.
+    `tol` is the clustering tolerance, can be a scalar or a 2-element for x and y
+    (None for automatic).
+    Return `x`, `y` grid coordinates and integer indices `ix`, `iy` of node for each point
+    (a matrix with shape (len(y), len(x)) has point k in `[iy[k], ix[k]]`)."""
+
+    points = np.asarray(points)
+    if np.size(tol) == 1:
+        tol = [tol, tol]
+    x, ix = cluster_coordinates(points[:, 0], tol[0])
+    y, iy = cluster_coordinates(points[:, 1], tol[1])
+    return x, y, ix, iy
+
+def uniform_axis(x, rtol=1e-3):
+    """return equally spaced axis with same ends and number of points of `x`
+    if `x` deviates from it less than `rtol` steps, None otherwise."""
+    if len(x) < 2:
+        return np.asarray(x, dtype=float)
+    xl = np.linspace(x[0], x[-1], len(x))
+    if np.max(np.abs(x - xl)) <= rtol*abs(xl[1] - xl[0]):
+        return xl
+    return None
+
+def _scatter(flat, z, nnodes, fill_value=np.nan):
+    """return array of `nnodes` with values `z` at flat indices `flat`: values on same node are
+    averaged, nodes without finite values are set to `fill_value`."""
+    good = np.isfinite(z)
+    n = np.bincount(flat[good], minlength=nnodes)
+    if good.all() and n.max() == 1:
+        data = np.full(nnodes, fill_value, dtype=np.result_type(z.dtype, np.min_scalar_type(fill_value)))
+        data[flat] = z
+        return data
+    with np.errstate(invalid='ignore', divide='ignore'):
+        data = np.bincount(flat[good], weights=z[good], minlength=nnodes)/n
+    data[n == 0] = fill_value
+    return data
+
+def _grid_node_index(c, g, rtol):
+    """return index of nearest node of equally spaced axis `g` for coordinates `c`.
+    Raise ValueError if any coordinate is farther than `rtol` steps (or `rtol` in
+    absolute value if `g` has a single node) from a node."""
+    if len(g) == 1:
+        if np.any(np.abs(c - g[0]) > rtol*max(abs(g[0]), 1.)):
+            raise ValueError('points are not on grid nodes.')
+        return np.zeros(len(c), dtype=np.intp)
+    step = (g[-1] - g[0])/(len(g) - 1)
+    f = np.rint((c - g[0])/step)
+    if np.any(f < 0) or np.any(f > len(g) - 1) or np.any(np.abs(c - g[0] - f*step) > rtol*abs(step)):
+        raise ValueError('points are not on grid nodes.')
+    return f.astype(np.intp)
+
+def points_to_matrix(points, tol=None, min_fill=0.5, xgrid=None, ygrid=None,
+                     fill_value=np.nan, rtol=1e-6):
+    """scatter points [Npoints x 3] aligned on a (possibly jittered) lattice into a matrix,
+    without interpolation. Values of points on same node are averaged, nodes without
+    (finite) points are `fill_value`.
+    Return data [Ny x Nx], x, y. Raise ValueError if the fraction of lattice nodes
+    with points is lower than `min_fill` (points are not on a grid).
+
+    If `xgrid` and `ygrid` are passed, points are on this known equally spaced grid
+    (`tol` and `min_fill` are not used): ValueError is raised if some points are farther
+    than `rtol` steps from a node, if points are a complete grid in standard order
+    (as from `points.grid_to_points`), data are a reshaped view of z with no copy.
+    2026/10/18 added known grid (was `points.points_to_matrix`)."""
+
+    points = np.asarray(points)
+    if xgrid is not None and ygrid is not None:
+        x = np.asarray(xgrid, dtype=float)
+        y = np.asarray(ygrid, dtype=float)
+        ny, nx = len(y), len(x)
+        if points.shape[0] == nx*ny:
+            if (np.array_equal(points[:, 0].reshape(ny, nx), np.broadcast_to(x[None, :], (ny, nx))) and
+                    np.array_equal(points[:, 1].reshape(ny, nx), np.broadcast_to(y[:, None], (ny, nx)))):
+                return points[:, 2].reshape(ny, nx), x, y
+        ix = _grid_node_index(points[:, 0], x, rtol)
+        iy = _grid_node_index(points[:, 1], y, rtol)
+        return _scatter(iy*nx + ix, points[:, 2], nx*ny, fill_value).reshape(ny, nx), x, y
+
+    x, y, ix, iy = points_grid_index(points, tol)
+    nnodes = x.size*y.size
+    if points.shape[0] < min_fill*nnodes:
+        raise ValueError('points are not aligned on a grid (%i points on %i x %i nodes).'%(
+            points.shape[0], x.size, y.size))
+    flat = iy*x.size + ix
+    count = np.bincount(flat, minlength=nnodes)
+    if np.count_nonzero(count) < min_fill*nnodes:
+        raise ValueError('points are not aligned on a grid (%i points on %i x %i nodes).'%(
+            points.shape[0], x.size, y.size))
+    return _scatter(flat, points[:, 2], nnodes, fill_value).reshape(y.size, x.size), x, y
+
+def test_points_to_matrix(nx=300, ny=200, jitter=1e-3, n=1):
+    """build a jittered shuffled cloud from a known surface and check that it is
+    scattered back into the original matrix."""
+    import time
+
+    x = np.linspace(0, 30, nx)
+    y = np.linspace(-10, 10, ny)
+    X, Y = np.meshgrid(x, y)
+    data = np.sin(X)*np.cos(Y)
+    data[5:10, 20:30] = np.nan
+    step = x[1] - x[0]
+    p = np.stack([X.ravel() + np.random.uniform(-jitter, jitter, X.size)*step,
+                  Y.ravel() + np.random.uniform(-jitter, jitter, X.size)*step,
+                  data.ravel()], axis=1)
+    p = p[np.random.permutation(p.shape[0])]
+
+    t0 = time.time()
+    for i in range(n):
+        d, xg, yg = points_to_matrix(p)
+    t1 = time.time()
+    print('%i points in %.3f s, grid %i x %i'%(p.shape[0], (t1-t0)/n, len(xg), len(yg)))
+    assert d.shape == data.shape
+    assert np.array_equal(d, data, equal_nan=True)
+    assert np.max(np.abs(xg - x)) < jitter*step and np.max(np.abs(yg - y)) < jitter*step
+
+    # known grid: view for ordered points, repeated nodes averaged, points off nodes rejected
+    po = np.stack([X.ravel(), Y.ravel(), data.ravel()], axis=1)
+    dk = points_to_matrix(po, xgrid=x, ygrid=y)[0]
+    assert np.shares_memory(dk, po) and np.array_equal(dk, data, equal_nan=True)
+    dk = points_to_matrix(np.vstack([po[::-1], po[:10]]), xgrid=x, ygrid=y)[0]
+    assert np.allclose(dk, data, equal_nan=True)
+    for bad in ([[0, 0, 1], [5, 1, 2]], [[0.5*step, 0, 1]]):
+        try:
+            points_to_matrix(np.array(bad, dtype=float), xgrid=x[:1] if len(bad) == 2 else x, ygrid=y)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('points off grid nodes accepted.')
+    return d, xg, yg
@@ -0,0 +1,137 @@
+"""Resampling of data on rectilinear grids, used in place of `scipy.interpolate.griddata`
+(which triangulates all points) when the source is already a grid.
+
+Linear interpolation is separable (along x, then along y) and reproduces bilinear
+interpolation on each cell. A result is nan if any grid node with nonzero weight
+is nan, or if it is outside the source grid (same as griddata outside the convex hull).
+Indices and weights for a couple of source and target grids are cached, so that repeated
+resampling on the same grids (e.g. `Dlist.resample(ref)`) skips their calculation.
+
+2026/10/18 written to replace griddata in `data2D.resample_data` and `points.resample_grid`.
+"""
+
+import hashlib
+from collections import OrderedDict
+import numpy as np
+from scipy.interpolate import RegularGridInterpolator
+
+_weights_cache = OrderedDict()
+WEIGHTS_CACHE_SIZE = 16
+
+def _axis_weights(xs, xt):
+    """return indices of lower and upper node on source axis `xs` (ascending) for each
+    point of target axis `xt`, fractional weight of upper node and mask of points inside `xs`.
+    Upper index is the same as lower for points on a node, so neighbours with zero weight
+    are not used."""
+    inside = (xt >= xs[0]) & (xt <= xs[-1])
+    i0 = np.clip(np.searchsorted(xs, xt, side='right') - 1, 0, len(xs)-1)
+    i1 = np.minimum(i0 + 1, len(xs)-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = np.where(i1 > i0, (xt - xs[i0])/(xs[i1] - xs[i0]), 0.)
+    t = np.where(inside, t, 0.)
+    i1 = np.where(t == 0, i0, i1)
+    return i0, i1, t, inside
+
+def resample_weights(xs, ys, xt, yt):
+    """return indices and weights (as returned by `_axis_weights`) along x and y for
+    resampling from grid `xs`, `ys` to `xt`, `yt`, from cache if already calculated."""
+
+    xs, ys, xt, yt = (np.asarray(v, dtype=float) for v in (xs, ys, xt, yt))
+    key = tuple(hashlib.sha1(v.tobytes()).hexdigest() for v in (xs, ys, xt, yt))
+    if key in _weights_cache:
+        _weights_cache.move_to_end(key)
+        return _weights_cache[key]
+
+    result = (_axis_weights(xs, xt), _axis_weights(ys, yt))
+    _weights_cache[key] = result
+    if len(_weights_cache) > WEIGHTS_CACHE_SIZE:
+        _weights_cache.popitem(last=False)
+    return result
+
+def _sort_grid(data, x, y):
+    """return data, x, y with ascending axes, None if axes are not monotonic."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    for v in (x, y):
+        d = np.diff(v)
+        if not (np.all(d > 0) or np.all(d < 0)):
+            return None
+    if x.size > 1 and x[1] < x[0]:
+        x = x[::-1]
+        data = data[:, ::-1]
+    if y.size > 1 and y[1] < y[0]:
+        y = y[::-1]
+        data = data[::-1, :]
+    return data, x, y
+
+def resample_regular(data, x, y, xt, yt, method='linear'):
+    """resample `data` defined on rectilinear grid `x`, `y` on a new grid `xt`, `yt`.
+    Return a [len(yt) x len(xt)] array, nan outside the range of source grid.
+    `method` can be 'linear' (bilinear, with cached weights) or 'cubic'
+    (`scipy.interpolate.RegularGridInterpolator`, requires all finite data and at least
+    4 points on each axis). Raise ValueError if the grid is not monotonic or cubic
+    interpolation is not possible, so that caller can use `griddata` instead."""
+
+    sg = _sort_grid(np.asarray(data), x, y)
+    if sg is None:
+        raise ValueError('source axes are not monotonic.')
+    data, x, y = sg
+    xt = np.asarray(xt, dtype=float)
+    yt = np.asarray(yt, dtype=float)
+
+    if method == 'linear':
+        (ix0, ix1, tx, xin), (iy0, iy1, ty, yin) = resample_weights(x, y, xt, yt)
+        data = np.asarray(data, dtype=float)
+        a = data[:, ix0]*(1-tx) + data[:, ix1]*tx  # along x, on all source rows
+        z = a[iy0, :]*(1-ty)[:, None] + a[iy1, :]*ty[:, None]
+        z[~yin, :] = np.nan
+        z[:, ~xin] = np.nan
+    elif method == 'cubic':
+        if min(len(x), len(y)) < 4 or not np.isfinite(data).all():
+            raise ValueError('cubic interpolation on grid requires finite data and at least 4 points per axis.')
+        f = RegularGridInterpolator((y, x), data, method='cubic', bounds_error=False, fill_value=np.nan)
+        yy, xx = np.meshgrid(yt, xt, indexing='ij')
+        z = f(np.stack([yy.ravel(), xx.ravel()], axis=-1)).reshape(len(yt), len(xt))
+    else:
+        raise ValueError("method must be 'linear' or 'cubic', got %s"%method)
+    return z
+
+def points_to_regular(points):
+    """if `points` [Npoints x 3] are the nodes of a complete rectilinear grid (in any order),
+    return data [Ny x Nx], x, y on this grid, otherwise return None."""
+
+    x, ix = np.unique(points[:, 0], return_inverse=True)
+    y, iy = np.unique(points[:, 1], return_inverse=True)
+    if x.size*y.size != points.shape[0]:
+        return None
+    flat = iy.ravel()*x.size + ix.ravel()
+    if np.bincount(flat, minlength=x.size*y.size).max() > 1:
+        return None  # repeated nodes
+    data = np.empty(x.size*y.size, dtype=float)
+    data[flat] = points[:, 2]
+    return data.reshape(y.size, x.size), x, y
+
+def test_resample_regular(nx=400, ny=300, nxt=350, nyt=280, n=3):
+    """compare resampling with `griddata` on a grid with some nan, repeated `n` times
+    on the same grids (weights from cache)."""
+    import time
+    from scipy.interpolate import griddata
+
+    x = np.linspace(-10, 10, nx)
+    y = np.linspace(-5, 5, ny)
+    data = x[None, :]*2 + y[:, None]*3  # plane, triangulation and bilinear interpolation agree
+    data[100:110, 50:60] = np.nan
+    xt = np.linspace(-11, 9, nxt)
+    yt = np.linspace(-4, 6, nyt)
+
+    t0 = time.time()
+    zg = griddata(np.array(np.meshgrid(x, y)).reshape(2, -1).T, data.ravel(),
+                  np.array(np.meshgrid(xt, yt)).reshape(2, -1).T).reshape(nyt, nxt)
+    t1 = time.time()
+    for i in range(n):
+        z = resample_regular(data, x, y, xt, yt)
+    t2 = time.time()
+    print('griddata: %.3f s, resample_regular: %.4f s per call'%(t1-t0, (t2-t1)/n))
+    print('different nan: %i, max difference: %g'%(np.sum(np.isnan(z) != np.isnan(zg)), np.nanmax(np.abs(z-zg))))
+    np.testing.assert_allclose(z, zg, rtol=0, atol=1e-10, equal_nan=True)
+    return z, zg
@@ -2,14 +2,74 @@ import matplotlib.pyplot as plt
 import numpy as np
 from dataIO.span import span
 from pyProfile.profile import remove_profile_outliers
-    
-def remove_outliers2d(data,x=None,y=None,nsigma=3,fignum=None,name='',includenan=True):
+
+def _interp_columns(y, keep):
+    """replace in place values of 2D `y` where `keep` is False with linear interpolation
+    along first axis of kept values in same column (constant at ends, as `np.interp`).
+    Columns without kept values are left unchanged.
+    Only rejected points are visited: they are grouped in runs of consecutive points
+    and the ends of each run give the kept neighbours."""
+    n = y.shape[0]
+    cols, rows = np.nonzero(~keep.T)  # sorted by column, then row
+    f = cols*n + rows  # position along concatenated columns
+    start = np.ones(f.size, dtype=bool)
+    start[1:] = np.diff(f) != 1
+    runid = np.cumsum(start) - 1
+    first = f[start]
+    last = f[np.append(start[1:], True)]
+    p = first[runid] - 1 - cols*n  # row of previous kept point, <0 if none in column
+    q = last[runid] + 1 - cols*n   # row of next kept point, >=n if none in column
+    good = (p >= 0) | (q < n)  # at least one kept point in column
+    rows, cols, p, q = rows[good], cols[good], p[good], q[good]
+    p0 = np.where(p < 0, q, p)
+    q0 = np.where(q >= n, p0, q)
+    yp = y[p0, cols]
+    yq = y[q0, cols]
+    dx = np.where(q0 > p0, q0 - p0, 1)
+    y[rows, cols] = (yq - yp)/dx*(rows - p0) + yp
+
+def clip_lines(data, nsigma=3, axis=0, itmax=1, blocksize=None, inplace=False):
+    """vectorized line by line outlier removal. Outliers are points more than `nsigma` standard deviations from mean of their line (along `axis`, default 0 for vertical lines as `remove_outliers2d`), they are replaced (together with nan) by linear interpolation of accepted points in the same line.
+    Mean and std are computed on masked lines for the whole matrix at once and clipping is repeated up to `itmax` times (only the first iteration is equivalent to `pyProfile.profile.remove_profile_outliers`). Lines with no accepted points are left unchanged.
+    Huge maps can be processed in blocks of `blocksize` lines to limit memory of temporary arrays.
+    Returns data with outliers replaced (a copy unless `inplace` is set) and mask of outliers.
+
+    2026/10/18 written to replace `np.apply_along_axis` of `remove_profile_outliers`."""
+
+    ldata = data if inplace else np.array(data)
+    ld = np.moveaxis(ldata, axis, 0)  # view, lines are columns
+    mask = np.zeros(ldata.shape, dtype=bool)
+    md = np.moveaxis(mask, axis, 0)
+    nl = ld.shape[1]
+    if blocksize is None:
+        blocksize = nl
+    for j in range(0, nl, blocksize):
+        y = ld[:, j:j+blocksize]
+        keep = ~np.isnan(y)
+        for it in range(itmax):
+            n = np.count_nonzero(keep, axis=0)
+            d = np.where(keep, y, 0.)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                d -= d.sum(axis=0)/n  # deviation from mean
+                d *= keep
+                std = np.sqrt(np.einsum('ij,ij->j', d, d)/n)
+                np.abs(d, out=d)
+                newkeep = (d < nsigma*std) & keep
+            if np.count_nonzero(newkeep) == n.sum():
+                break
+            keep = newkeep
+        if not keep.all():
+            _interp_columns(y, keep)
+        md[:, j:j+blocksize] = ~keep
+    return ldata, mask
+
+def remove_outliers2d(data,x=None,y=None,nsigma=3,fignum=None,name='',includenan=True,blocksize=None):
     """remove outliers line by line by interpolation (along vertical lines).
-    If fignum is set, plot comparison in corresponding figure."""
+    If fignum is set, plot comparison in corresponding figure.
+    2026/10/18 vectorized with `clip_lines`, `blocksize` number of columns processed at once (default all).
+    `includenan` is kept for compatibility, nan are always interpolated."""
 
-    ldata= data.copy()
-    mask=np.apply_along_axis( remove_profile_outliers, axis=0, arr=ldata, 
-        nsigma=nsigma ,includenan=includenan) #this modifies ldata and return a mask
+    ldata, mask = clip_lines(data, nsigma=nsigma, axis=0, blocksize=blocksize)
 
     #these are used only to determine min and max.
     if x is None:
@@ -125,4 +185,22 @@ def remove_outliers2d2(data,x=None,y=None,nsigma=3,degree=1,fignum=None,name='',
             plt.legend(loc=0)
         plt.show()
         
-    return ldata
\ No newline at end of file
+    return ldata
+
+
+def test_clip_lines(shape=(2000,2000), nsigma=3):
+    """compare `clip_lines` with `np.apply_along_axis` of `remove_profile_outliers`."""
+    import time
+    data = np.random.standard_normal(shape)
+    data[np.random.random(shape) < 0.01] += 10
+    data[np.random.random(shape) < 0.01] = np.nan
+
+    t0 = time.time()
+    ldata = data.copy()
+    np.apply_along_axis(remove_profile_outliers, axis=0, arr=ldata, nsigma=nsigma)
+    t1 = time.time()
+    ldata2, mask = clip_lines(data, nsigma=nsigma)
+    t2 = time.time()
+    print('apply_along_axis: %.3f s, clip_lines: %.3f s, max difference: %g'%(t1-t0, t2-t1, np.nanmax(np.abs(ldata-ldata2))))
+    assert np.array_equal(np.isnan(ldata), np.isnan(ldata2))
+    return ldata2, mask
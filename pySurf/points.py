@@ -13,6 +13,9 @@ from astropy.io import fits
 #from matplotlib.mlab import griddata
 #from scipy.interpolate import griddata
 from dataIO.running_mean import running_mean
+from dataIO.cache import cached_reader
+from pySurf.grid_resample import resample_regular, points_to_regular
+from pySurf import grid_index
 from scipy import stats
 from plotting.add_clickable_markers import add_clickable_markers2
 
@@ -89,9 +92,11 @@ def crop_points1(points,xrange=None,yrange=None,zrange=None,
             points=points[(points[:,2]<=zrange[1]),:]
     return points
 
-def crop_points(points,xrange=None,yrange=None,zrange=None,mask=False,poly=None,interactive=False):
+def crop_points(points,xrange=None,yrange=None,zrange=None,mask=False,poly=None,interactive=False,tree=None):
     """experimental version, adds option booleam to return mask. useful e.g. to clean data based on crop on deltaR"""
-    """crop a xyz points [Nx3], keeping only points inside xrange and yrange defined as (min,max)."""
+    """crop a xyz points [Nx3], keeping only points inside xrange and yrange defined as (min,max).
+    If a `tree` (from `points_tree(points)`) is passed, only points in the bounding box of
+    ranges and polygon are tested (2026/10/18)."""
 
     #outmask is sized as points and must remain same size all time.
     # at the end if flag mask is set, outmask is returned, else points are filtered.
@@ -119,6 +124,14 @@ def crop_points(points,xrange=None,yrange=None,zrange=None,mask=False,poly=None,
         if curfig:
             plt.figure(curfig.number);
 
+    allpoints=points
+    if tree is not None:
+        box=_crop_box(xrange,yrange,poly)
+        idx=None if box is None else tree_in_box(tree,*box)
+        if idx is not None:
+            points=points[idx]
+            outmask=np.ones(len(idx),dtype=bool)
+
     if poly:
         outmask=outmask & points_in_poly(points,poly)
 
@@ -138,6 +151,12 @@ def crop_points(points,xrange=None,yrange=None,zrange=None,mask=False,poly=None,
         if zrange[1] is not None:
             outmask &= (points[:,2]<=zrange[1])
 
+    if points is not allpoints:  #candidates from tree
+        if mask:
+            m=np.zeros(allpoints.shape[0],dtype=bool)
+            m[idx[outmask]]=True
+            return m
+        return allpoints[np.sort(idx[outmask])]
     points=outmask if mask else points[outmask]
 
     return points
@@ -279,18 +298,145 @@ def points_in_poly2(pts,vert):
     polygon = Polygon(verts)
     return polygon.contains(point)
 
-def points_in_poly(pts,verts):
+def points_in_poly(pts,verts,tree=None):
+    """return a boolean array, True for points inside polygon with vertices `verts`.
+    If a `tree` (from `points_tree(pts)`) is passed, only points in the bounding box of
+    polygon are tested (2026/10/18)."""
     from matplotlib import path
     p=path.Path(verts)
     if pts.shape[1] == 3:
         pts=pts[:,:2]
     elif pts.shape[1] != 2:
         raise ValueError("wrong shape for points in points_find_hull")
+    if tree is not None:
+        (x0,y0),(x1,y1)=span(np.asarray(verts),axis=0).T
+        idx=tree_in_box(tree,x0,x1,y0,y1)
+        if idx is not None:
+            res=np.zeros(pts.shape[0],dtype=bool)
+            res[idx]=p.contains_points(pts[idx])
+            return res
     return p.contains_points(pts)
     #return np.hstack([pts[:,:2],p.contains_points(pts)[:,np.newaxis]])
 
 
 
+## SPATIAL INDEX
+## 2026/10/18 functions using a `scipy.spatial.cKDTree` on xy of points, built once with
+##   `points_tree` and passed as `tree` argument to avoid scanning all points at each query
+##   (see `PointCloud.Points.tree` for an index kept with points).
+##   `smooth_points` and `rebin_points` don't use it: they put points on grid nodes in a single
+##   O(N) pass (`grid_index.points_to_matrix`, `stats.binned_statistic_2d`) with no neighbour
+##   queries, a tree would only add its construction. For scattered points use `radius_smooth_points`.
+
+def points_tree(points):
+    """return a `scipy.spatial.cKDTree` on x and y of `points` [Npoints x 2 or 3]."""
+    from scipy.spatial import cKDTree
+    return cKDTree(np.asarray(points)[:,:2])
+
+def tree_in_box(tree,x0,x1,y0,y1):
+    """return indices of points in `tree` with x0<=x<=x1, y0<=y<=y1 (sorted).
+    Return None if the box covers a large fraction of the points area, in that case it is
+    faster to test all points directly."""
+    w=np.minimum([x1,y1],tree.maxes)-np.maximum([x0,y0],tree.mins)
+    if np.all(w>0) and np.prod(w)>0.1*np.prod(tree.maxes-tree.mins):
+        return None
+    c=[(x0+x1)/2.,(y0+y1)/2.]
+    r=max(x1-x0,y1-y0)/2.
+    idx=np.asarray(tree.query_ball_point(c,r,p=np.inf),dtype=np.intp)  #square around box
+    xy=tree.data[idx]
+    sel=(xy[:,0]>=x0)&(xy[:,0]<=x1)&(xy[:,1]>=y0)&(xy[:,1]<=y1)
+    return np.sort(idx[sel])
+
+def _crop_box(xrange,yrange,poly):
+    """bounding box (x0,x1,y0,y1) of ranges and polygon for crop, None if unbounded."""
+    box=[-np.inf,np.inf,-np.inf,np.inf]
+    if poly:
+        (box[0],box[2]),(box[1],box[3])=span(np.asarray(poly),axis=0).T
+    for i,r in ((0,xrange),(2,yrange)):
+        if r is not None:
+            if r[0] is not None: box[i]=max(box[i],r[0])
+            if r[1] is not None: box[i+1]=min(box[i+1],r[1])
+    if not np.all(np.isfinite(box)):
+        return None
+    return box
+
+def radius_smooth_points(points,radius,k=32,tree=None,chunksize=2**16):
+    """return a copy of `points` [Npoints x 3] with z replaced by the average of valid z of
+    neighbours (including the point itself) within distance `radius`, up to the `k` nearest.
+    Neighbours are found with KD-tree `tree` (built if not passed), processing `chunksize`
+    points at a time to limit memory."""
+
+    if tree is None:
+        tree=points_tree(points)
+    z=points[:,2]
+    res=np.array(points,dtype=float)
+    k=min(k,points.shape[0])
+    for i in range(0,points.shape[0],chunksize):
+        d,j=tree.query(points[i:i+chunksize,:2],k=k,distance_upper_bound=radius)
+        d=d.reshape(d.shape[0],-1)
+        j=j.reshape(j.shape[0],-1)
+        zz=np.where(np.isfinite(d),z[np.minimum(j,len(z)-1)],np.nan)  #missing neighbours have j=len(z)
+        with np.errstate(invalid='ignore'):
+            res[i:i+chunksize,2]=np.nansum(zz,axis=1)/np.sum(np.isfinite(zz),axis=1)
+    return res
+
+def resample_nearest(points,positions,k=1,radius=np.inf,tree=None):
+    """resample points [Npoints x 3] on `positions` [Mpoints x 2 or 3] from the `k` nearest
+    neighbours within `radius` (value of nearest point for k=1, inverse distance weighted
+    average of valid z otherwise, nan if no neighbours). Return [Mpoints x 3] points.
+    Faster alternative to `resample_points` (no triangulation) for dense clouds."""
+
+    if tree is None:
+        tree=points_tree(points)
+    positions=np.asarray(positions)
+    d,j=tree.query(positions[:,:2],k=k,distance_upper_bound=radius)
+    d=d.reshape(d.shape[0],-1)
+    j=j.reshape(j.shape[0],-1)
+    found=np.isfinite(d)
+    zz=np.where(found,points[np.minimum(j,points.shape[0]-1),2],0.)
+    if k==1:
+        z=np.where(found[:,0],zz[:,0],np.nan)
+    else:
+        found&=np.isfinite(zz)
+        zz=np.where(found,zz,0.)
+        with np.errstate(divide='ignore',invalid='ignore'):
+            w=np.where(found,1./d,0.)
+            exact=(d==0)&found
+            w=np.where(exact.any(axis=1)[:,None],exact.astype(float),w)  #on a point, use its value
+            z=np.sum(w*zz,axis=1)/np.sum(w,axis=1)
+    return np.hstack([positions[:,:2],z[:,np.newaxis]])
+
+def merge_duplicates(points,tol=0.,tree=None):
+    """merge points [Npoints x 3] closer than `tol` in xy (chains of close points are merged
+    together), returning averages of x, y and valid z for each group.
+    Points not merged keep their order, merged groups are placed at the position of their first point."""
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    if tree is None:
+        tree=points_tree(points)
+    n=points.shape[0]
+    pairs=tree.query_pairs(tol,output_type='ndarray')
+    if len(pairs)==0:
+        return np.array(points)
+    g=coo_matrix((np.ones(len(pairs)),(pairs[:,0],pairs[:,1])),shape=(n,n))
+    ncomp,label=connected_components(g,directed=False)
+    first=np.full(ncomp,n)
+    np.minimum.at(first,label,np.arange(n))
+    order=np.argsort(first)  #groups in order of first point
+    rank=np.empty(ncomp,dtype=np.intp)
+    rank[order]=np.arange(ncomp)
+    lab=rank[label]
+    cnt=np.bincount(lab,minlength=ncomp)
+    res=np.empty((ncomp,points.shape[1]))
+    res[:,0]=np.bincount(lab,weights=points[:,0],minlength=ncomp)/cnt
+    res[:,1]=np.bincount(lab,weights=points[:,1],minlength=ncomp)/cnt
+    good=np.isfinite(points[:,2])
+    with np.errstate(invalid='ignore'):
+        res[:,2]=np.bincount(lab[good],weights=points[good,2],minlength=ncomp)/np.bincount(lab[good],minlength=ncomp)
+    return res
+
+
 def clipStats(p,clip):
     print('clip for %s : %s'%(clip))
     print('z range: %s : %s'%(np.nanmin(p[:,2]),np.nanmax(p[:,2])))
@@ -326,7 +472,10 @@ def histostats(points,bins=100,log=True,*args,**kwargs):
     return result
 
 ## I/O
-def matrix_to_points2(mdata,x=None,y=None,xrange=None,yrange=None):
+def matrix_to_points2(mdata,x=None,y=None,xrange=None,yrange=None,dropnan=False):
+    """convert matrix `mdata` [Ny x Nx] to points [Npoints x 3]. Axis are `x` and `y`, or
+    equally spaced on `xrange`, `yrange`, or indices. If `dropnan` is set, points with invalid
+    data are excluded. Points are filled from broadcast axis (see `grid_to_points`)."""
     ny,nx= mdata.shape  #changed 2015/11/04  to read ryan's data, this is because of python array shape (y,x) and because data are assumed to be in same order as image. Not sure gwyddion or nanovea data are in same format (but it should still work and giving a transposed result).
     #nx,ny= mdata.shape
     if x is None and y is None:
@@ -338,11 +487,38 @@ def matrix_to_points2(mdata,x=None,y=None,xrange=None,yrange=None):
             x=np.linspace(*xrange,num=nx)
             y=np.linspace(*yrange,num=ny)
 
-    xpoints,ypoints=[xy.flatten() for xy in np.array(np.meshgrid(x,y))]
-    zpoints=mdata.flatten()
-    points=np.vstack([xpoints,ypoints,zpoints]).T
-    return points
-
+    return grid_to_points(mdata,x,y,dropnan=dropnan)
+
+def grid_coordinates(data,x,y):
+    """return x, y and z of each element of `data` [Ny x Nx] on grid `x`, `y` as read-only
+    broadcast views with the shape of data (no memory is allocated for coordinates)."""
+    data=np.asarray(data)
+    x=np.asarray(x)
+    y=np.asarray(y)
+    return np.broadcast_to(x[np.newaxis,:],data.shape),np.broadcast_to(y[:,np.newaxis],data.shape),data
+
+def grid_to_points(data,x,y,dropnan=False,dtype=None):
+    """convert `data` [Ny x Nx] on grid `x`, `y` to points [Npoints x 3] (x changes faster),
+    filling the output array directly from broadcast coordinates, with no full-size temporaries.
+    If `dropnan` is set, points with invalid data are not included.
+    `dtype` of points is by default the common type of data and axis.
+    2026/10/18 replaces meshgrid and vstack in `matrix_to_points2`."""
+
+    X,Y,Z=grid_coordinates(data,x,y)
+    if dtype is None:
+        dtype=np.result_type(X.dtype,Y.dtype,Z.dtype)
+    if dropnan:
+        mask=np.isfinite(Z)
+        points=np.empty((np.count_nonzero(mask),3),dtype=dtype)
+        points[:,0]=X[mask]
+        points[:,1]=Y[mask]
+        points[:,2]=Z[mask]
+        return points
+    points=np.empty(Z.shape+(3,),dtype=dtype)
+    points[...,0]=X
+    points[...,1]=Y
+    points[...,2]=Z
+    return points.reshape(-1,3)
 
 def matrix_to_points(data,xgrid,ygrid,transpose=False):
     """this assumes that the order in data (after flattening) follows the order of
@@ -355,6 +531,7 @@ def matrix_to_points(data,xgrid,ygrid,transpose=False):
     return np.vstack([x.flatten(),y.flatten(),data.T.flatten()]).T
 
 
+@cached_reader
 def get_points(filename,x=None,y=None,xrange=None,yrange=None,matrix=False,addaxis=False,scale=None,center=None,skip_header=None,delimiter=','):
     """
     Return a set of xyz points (N,3) from generic csv files in xyz or matrix format.
@@ -390,6 +567,7 @@ def get_points(filename,x=None,y=None,xrange=None,yrange=None,matrix=False,addax
     TODO: reduce overlapping with `data2D.data_from_txt`.
     2018/02/17 reintroduced xrange even if discorauged. implemented x and y (unused as well) to axis, range
     or indices.
+    Results can be cached on disk with `cache=True` (see `dataIO.cache`).
 
     """
     #import pdb
@@ -838,6 +1016,7 @@ def resample_grid(tpoints,xgrid=None,ygrid=None,matrix=False,resample=True):
     matrix=True-->points to matrix
     p=resample_grid(p) #straighten the grid of p changing data as little as possible
     matrix=False,resample=False-> Convert from matrix to points without resampling if matrix input, useless if input is points (do two opposite operations that should cancel each other).
+    2026/10/18 if valid points form a complete rectilinear grid, they are interpolated on the grid (bilinear or cubic, `pySurf.grid_resample`) instead of triangulated with `griddata`.
 
     """
     """ old (matrix=False):
@@ -851,7 +1030,16 @@ def resample_grid(tpoints,xgrid=None,ygrid=None,matrix=False,resample=True):
     tpoints=tpoints[np.isfinite(tpoints[:,2]),:]  #2018/10/01
     x,y=np.meshgrid(xgrid,ygrid)
     if resample:  #if both resample and matrix are False, two useless operations are performed and the final array is unchanged.
-        z=ip.griddata(tpoints[:,0:2],tpoints[:,2],(x,y),method=method) #this is super slow, but still faster than the one in matplotlib
+        z=None
+        if method in ('linear','cubic'):
+            grid=points_to_regular(tpoints)  #2026/10/18 complete grid of valid points, no need to triangulate
+            if grid is not None:
+                try:
+                    z=resample_regular(*grid,np.asarray(xgrid),np.asarray(ygrid),method=method)
+                except ValueError:
+                    pass
+        if z is None:
+            z=ip.griddata(tpoints[:,0:2],tpoints[:,2],(x,y),method=method) #this is super slow, but still faster than the one in matplotlib
     else:
         z=tpoints[:,2].reshape(ygrid.size,xgrid.size)
     if matrix:
@@ -871,7 +1059,11 @@ def points_autoresample(points,cut=0,resample=True):
     This routine returns data,x,y
     Same result can be obtained by calling
     resample_grid (without providing x and y)
-    AND points_find_grid to determine x and y."""
+    AND points_find_grid to determine x and y.
+    2026/10/18 grid is first searched with `pySurf.grid_index` (any point order, jitter
+    tolerant). If points fill an equally spaced lattice with valid values (or `resample`
+    is False), they are put in the matrix with no interpolation. Otherwise they are
+    resampled on the lattice, or on the grid from points_find_grid if no lattice is found."""
 
     '''
 def points_autoresample(points,edge=0):
@@ -884,7 +1076,20 @@ def points_autoresample(points,edge=0):
     y=y[edge:len(y)-edge]
     '''
     #print 'obsolete, replace with resample_grid(points,matrix=True)'
-    fastax,(x,y)=points_find_grid(points,result='grid')
+    try:
+        data,x,y=grid_index.points_to_matrix(points)
+    except ValueError:  #not on a lattice
+        data=None
+    if data is not None:
+        xu,yu=grid_index.uniform_axis(x),grid_index.uniform_axis(y)
+        if xu is not None and yu is not None and (not resample or np.isfinite(data).all()):
+            if cut>0:
+                return data[cut:-cut,cut:-cut],xu[cut:-cut],yu[cut:-cut]
+            return data,xu,yu
+        x=np.linspace(x[0],x[-1],len(x))
+        y=np.linspace(y[0],y[-1],len(y))
+    else:
+        fastax,(x,y)=points_find_grid(points,result='grid')
     if cut>0:
         x=x[cut:-cut]
         y=y[cut:-cut]
@@ -1216,7 +1421,7 @@ def smooth_points(points,xywidth,xgrid=None,ygrid=None,shape=None,matrix=False):
     """resample points on a grid and perform moving average smoothin in x and y according to xywidth,
     if one component is None smoothing in that direction is not performed.
     Return points in usual coordinates, unless matrix flag is set."""
-    data=points_to_matrix(points,xgrid,ygrid)
+    data=grid_index.points_to_matrix(points,xgrid=xgrid,ygrid=ygrid)[0]
     if not(xywidth[0] is None):
         data=np.apply_along_axis(running_mean,0,data,xywidth[0])
     if not(xywidth[1] is None):
@@ -1,10 +1,11 @@
 
 
 
-from pyProfile.psd import plot_sig_psd, normPSD
+from pyProfile.psd import plot_sig_psd, normPSD, psd_plan, welch_segments
 import matplotlib.pyplot as plt
 import numpy as np
 import os
+import warnings
 from dataIO.span import span
 from dataIO.fn_add_subfix import fn_add_subfix
 from dataIO.dicts import strip_kw
@@ -26,15 +27,66 @@ from plotting.multiplots import compare_images
 import pdb
 
 
-def psd2d(data, x, y, wfun=None, norm=1, rmsnorm=False):
+def _lomb_power(t,d,valid,N):
+    """squared modulus of fft equivalent to `np.fft.rfft` on `N` points for
+    columns of `d` sampled on times `t` with only points in `valid`, 
+    estimated by least square fit of sinusoids at fft frequencies 
+    (Lomb-Scargle periodogram).
+    All columns are fit together: sums over valid points of each column are products of 
+    (frequencies x times) matrices of sinusoids with the (times x columns) matrices of data and mask.
+    2026/10/18 vectorized over columns."""
+    
+    w = 2*np.pi*np.fft.rfftfreq(N)[:,None]  # angular frequency per sample
+    m = valid.astype(float)
+    y = np.where(valid,d,0.)
+    n = m.sum(axis=0)
+    wt = w*t[None,:]
+    C2,S2 = np.cos(2*wt)@m,np.sin(2*wt)@m
+    Cy,Sy = np.cos(wt)@y,np.sin(wt)@y
+    # time offset tau makes sin and cos terms orthogonal
+    wtau = np.arctan2(S2,C2)/2
+    wtau[w[:,0]==0] = 0
+    c,s = np.cos(wtau),np.sin(wtau)
+    c2,s2 = np.cos(2*wtau),np.sin(2*wtau)
+    # sums with arg = w*(t-tau) of cos(arg)**2, sin(arg)**2, y*cos(arg) and y*sin(arg)
+    cc = (n+c2*C2+s2*S2)/2
+    ss = (n-c2*C2-s2*S2)/2
+    yc = c*Cy+s*Sy
+    ys = c*Sy-s*Cy
+    with np.errstate(divide='ignore',invalid='ignore'):
+        a = yc/cc
+        # zero and Nyquist frequencies have only cosine term 
+        onlycos = ss < 1e-9*n
+        b = np.where(onlycos,0,ys/np.where(onlycos,1,ss))
+    res = np.where(onlycos,N**2*a**2,N**2/4*(a**2+b**2))
+    res[:,n==0] = np.nan
+    return res
+
+def psd2d(data, x, y, wfun=None, norm=1, rmsnorm=False, nanmode=None, workers=None,
+          nperseg=None, noverlap=None):
         """Calculate the 2d psd. return freq and psd.
         
-        doesnt work with nan.
         use 2d function for psd np.fft.rfft2 for efficiency and mimics
             what done in pySurf.psd.psd
         norm defines the normalization, see function psd.normPSD.
+        Columns containing nans are handled according to `nanmode`:
+            'zero': nans are replaced by zeros and psd of each column is divided 
+                by the (windowed) fraction of valid points (preserves total power,
+                but spreads peaks).
+            'lomb': psd of columns with nans is estimated with a Lomb-Scargle 
+                periodogram on valid points (preserves amplitude of peaks, 
+                slower).
+            None (default): nans are not handled (columns with nans have nan psd).
+        In all cases, columns with no nans are unchanged and columns with no valid
+        points have nan psd.
+        Window, normalization and frequencies are reused from a cached 
+        `pyProfile.psd.psd_plan`, `workers` is the number of threads for fft.
+        If `nperseg` is set, psd of each column is averaged over segments of `nperseg` 
+        points overlapping by `noverlap` (Welch method, see `pyProfile.psd.psd`),
+        all segments of all columns are transformed in a single fft. 
         2017/01/11 broken interface from (x,y,data..),
-        added check to correct on the base of sizes."""
+        added check to correct on the base of sizes.
+        2026/10/18 added `nanmode`, `workers` and Welch mode."""
         #2017/08/01 complete refactoring, this was internal _psd2d,
         # now is made analogous of 1d pySurf.psd.psd
         # The previous psd2d was including a lot of plotting and output,
@@ -44,25 +96,100 @@ def psd2d(data, x, y, wfun=None, norm=1, rmsnorm=False):
         # window, the rms is the rms of the windowed function.
         
         #assert data.shape[0]==data.shape[1]
-        if wfun is None:
-            win=np.ones(data.shape[0])[:,None]
-        else:
-            win=wfun(data.shape[0])[:,None]
+        if nperseg is not None:
+            # segments of all columns are put side by side as columns of a single 2D array,
+            # trailing axes (e.g. of a stack from `psd2d_stack`) are folded in the columns.
+            cshape=data.shape[1:]
+            cols=data.reshape(data.shape[0],-1)
+            segs=welch_segments(cols,nperseg,noverlap)  # nseg x nperseg x ncols
+            nseg,ncols=segs.shape[0],cols.shape[1]
+            segs=np.moveaxis(segs,0,1).reshape(nperseg,nseg*ncols)
+            freqs,psd=psd2d(segs,np.arange(nseg*ncols),y[:nperseg],wfun=wfun,norm=norm,
+                            rmsnorm=rmsnorm,nanmode=nanmode,workers=workers)
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore',RuntimeWarning)  # all-nan columns
+                psd=np.nanmean(psd.reshape(len(freqs),nseg,ncols),axis=1)
+            return freqs,psd.reshape((len(freqs),)+cshape)
+        
         N=data.shape[0]
         L=span(y,True)
-        yfft=np.fft.rfft2(data*win,axes=[0])
+        plan=psd_plan(N,L,wfun=wfun,norm=norm,workers=workers)
+        win=plan.window(axis=0,ndim=data.ndim)
+        
+        valid=np.isfinite(data)
+        nancols=~valid.all(axis=0)
+        if nanmode is None or not nancols.any():
+            yfft=plan.rfft(data,axis=0)
+            power=np.abs(yfft)**2
+        elif nanmode == 'zero':
+            yfft=plan.rfft(np.where(valid,data,0),axis=0)
+            power=np.abs(yfft)**2
+            w2=np.sum(win**2)
+            frac=np.sum(valid*win**2,axis=0)/w2 #fraction of valid (windowed) power
+            with np.errstate(divide='ignore',invalid='ignore'):
+                power[:,nancols]=power[:,nancols]/frac[nancols]
+            power[:,frac==0]=np.nan
+        elif nanmode == 'lomb':
+            yfft=plan.rfft(np.where(valid,data,0),axis=0)
+            power=np.abs(yfft)**2
+            power[:,nancols]=_lomb_power(np.arange(N),(data*win)[:,nancols],valid[:,nancols],N)
+        else:
+            raise ValueError("nanmode must be 'zero', 'lomb' or None: %s"%nanmode)
 
-        normfactor=normPSD(N,L,form=norm)
+        normfactor=plan.normfactor
         if rmsnorm:  #normalize to rms of non windowed function
             normfactor=normfactor*np.nanstd(data,axis=0)**2/np.nanstd(data*win,axis=0)**2
 
-        psd=2*normfactor*(np.abs(yfft))**2
+        psd=2*np.asarray(normfactor,dtype=power.dtype)*power  #keeps single precision if data are float32
         psd[0,:]=psd[0,:]/2.
 
-        freqs = np.fft.rfftfreq(N,np.float(L)/(N-1))
+        freqs = plan.freqs.copy()
 
         return freqs,psd
 
+def psd2d_stack(data, x=None, y=None, chunksize=None, dtype=None, *args, **kwargs):
+    """Calculate 2d psd of many surfaces of same shape and coordinates.
+    
+    `data` is a (N, ny, nx) array or a list of N `Data2D` with same x and y 
+    (in this case `x` and `y` are taken from first element if not provided).
+    Return frequencies, (N, nf, nx) array of 2d psds and (N, nf) array of their 
+    averages (as `avgpsd2d`). 
+    Psds are calculated with `psd2d` (all other arguments are passed to it) on all columns
+    of all surfaces with a single fft (along first axis of a (ny, N, nx) view of the stack).
+    `chunksize` surfaces at a time are processed, limiting memory use, by default
+    chunks of about 4M points (it is usually faster than a single fft of a large stack). 
+    `dtype` can be set to `np.float32` to compute in single precision.
+    2026/10/18"""
+    
+    if not isinstance(data,np.ndarray):
+        #list of Data2D
+        if x is None: x = data[0].x
+        if y is None: y = data[0].y
+        data = [d.data for d in data]
+    data = np.asarray(data)
+    if data.ndim != 3:
+        raise ValueError("data must be a (N, ny, nx) stack, shape is %s"%(data.shape,))
+    n,ny,nx = data.shape
+    if x is None: x = np.arange(nx)
+    if y is None: y = np.arange(ny)
+    if chunksize is None: chunksize = max(1,2**22//(ny*nx))
+    
+    psds = None
+    for i in range(0,n,chunksize):
+        chunk = data[i:i+chunksize]
+        if dtype is not None: chunk = chunk.astype(dtype,copy=False)  #converted by chunk to limit memory
+        k = len(chunk)
+        # psd2d works along first axis of (ny, k, nx) view
+        f,p = psd2d(np.moveaxis(chunk,0,1),x,y,*args,**kwargs)
+        if psds is None:
+            psds = np.empty((n,len(f),nx),dtype=p.dtype)
+        psds[i:i+k] = np.moveaxis(p,1,0)
+    
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore',RuntimeWarning)  # all-nan frequencies
+        avg = np.nanmean(psds,axis=2)
+    return f,psds,avg
+
 #COMPUTATION
 def avgpsd2d(psddata,axis=1,span=False,expand=False):
 
@@ -75,37 +202,69 @@ def avgpsd2d(psddata,axis=1,span=False,expand=False):
     from pySurf.data2D import projection
     return projection(psddata,axis=axis,span=span,expand=expand)
 
+def _band_limits(f,rmsrange):
+    """return frequency limits for `rmsrange`, replacing None as in `rms_power`."""
+    if rmsrange is None:
+        rmsrange=[None,None]
+    fmin,fmax=rmsrange
+    if fmin is None:
+        fmin = f[1] if f[0] == 0 else np.min(f,axis=0)
+    if fmax is None:
+        fmax = np.max(f,axis=0)
+    return fmin,fmax
+
+def rms_power_bands(f,p,rmsranges):
+    """integrate `p` over many frequency ranges at once, return rms for each range.
+    
+    `p` can be a psd (nf), a 2d psd (nf, ncols) or a stack of 2d psds (N, nf, ncols), 
+    frequency `f` is along axis 0 for 1D `p`, along axis -2 otherwise, and must be sorted
+    and equally spaced. `rmsranges` is a list of [fmin, fmax] ranges, 
+    None values are replaced as in `rms_power`.
+    Return array with frequency axis replaced by one element for each range, 
+    (nbands), (nbands, ncols) or (N, nbands, ncols), each value as calculated by `rms_power`.
+    A table of cumulative integrals is built once and each band is obtained by difference 
+    of two elements (cumulated from highest frequency, where power is usually lower,
+    to limit rounding errors)."""
+    
+    p = np.asarray(p)
+    ax = 0 if p.ndim == 1 else p.ndim-2
+    pp = np.moveaxis(p,ax,0)  # nf x ...
+    valid = ~np.isnan(pp)
+    
+    #cumulative sums from the end, with a zero for empty sum
+    zero = np.zeros((1,)+pp.shape[1:])
+    cum = np.concatenate([np.cumsum(np.where(valid,pp,0)[::-1],axis=0)[::-1],zero])
+    cnt = np.concatenate([np.cumsum(valid[::-1],axis=0)[::-1],zero])
+    
+    limits = np.array([_band_limits(f,r) for r in rmsranges],dtype=float).reshape(-1,2)
+    i0 = np.searchsorted(f,limits[:,0],side='left')
+    i1 = np.searchsorted(f,limits[:,1],side='right')
+    i1 = np.maximum(i0,i1)
+    df = f[1]-f[0]
+    
+    rms = np.sqrt((cum[i0]-cum[i1])*df)
+    rms[(cnt[i0]-cnt[i1]) == 0] = np.nan  #set nan where invalid
+    return np.moveaxis(rms,0,ax)
+
 def rms_power(f,p,rmsrange=None,squeeze=True):
     """integrate `p` (2dpsd) to calculate rms slice power in a range of freq. f is the  frequency axis (vertically oriented in plots) for p. Accepts None as extreme of rmsrange. frequencies are assumed to be equally spaced.
-    Return a vectors rms with one element for each range in rmsrange. If one element, extra dimension is
-        removed unless squeeze is set (useful e.g. to call from wrapper function and get consistent behavior).
+    Return a vector rms with one element for each column of `p`. If `squeeze` is set (default), the axis of 
+        ranges is removed, otherwise it is kept with length one as in `rms_power_bands` (e.g. (1, ncols), 
+        useful to call from wrapper function and get consistent behavior with many ranges).
     Note that total rms is calculated as rms of column rms, calculated from PSD for each column. If f[0] is zero, the component is excluded, unless first component of rmsrange is explicitly set to zero. If you want to include all frequencies but zero, set rms range first component to None (or rmsrange itself to None).
     Values can then differ from surface rms in case of invalid points (e.g. as consequence of the fact
     that all lines are weighted equally in line average and also invalid points are excluded).
+    To calculate many ranges at once use `rms_power_bands`.
     2020/07/21 corrected handling of zero frequency and added `includezerofreq` Flag. 
+    2026/10/18 calculated with `rms_power_bands`, `rmsrange` is not modified anymore,
+    `squeeze` is used (it had no effect).
     """
     
     #20180404 renamed _rms_power -> rms_power and rms_power -> plot_rms_power
-    if rmsrange is None:
-        rmsrange=[None,None]
-    if rmsrange[0] is None:
-        if f[0] == 0:
-            rmsrange[0]=f[1]
-        else:
-            rmsrange[0]=np.min(f,axis=0)
-    if rmsrange[1] is None:
-        rmsrange[1]=np.max(f,axis=0)
-
-    mask=(f>=rmsrange[0]) & (f<=rmsrange[1])
-    df=f[1]-f[0]
-
-    rms=np.sqrt(np.nansum(p[mask,:],axis=0)*df)  #integrate psd for rms
-    rms[np.all(np.isnan(p[mask,:]),axis=0)]=np.nan  #set nan where invalid
-    #pdb.set_trace()
+    rms=rms_power_bands(f,p,[rmsrange])
     if squeeze:
-        if len(rms.shape)==1:
-            rms.flatten()
-
+        rms=rms[0] if rms.ndim == 1 else np.take(rms,0,axis=-2)
+    
     return rms
 
 def plot_rms_power(f,p,x=None,rmsrange=None,ax2f=None,units=None,*args,**kwargs):
@@ -164,10 +323,11 @@ def plot_rms_power(f,p,x=None,rmsrange=None,ax2f=None,units=None,*args,**kwargs)
             ax4=ax3.twinx()
 
         #plt.title(plt.title()+' rms=')
-        for fr,a in zip(rmsrange,ax2f):
+        rms_bands=rms_power_bands(f,p,rmsrange)  #all ranges at once
+        for i,(fr,a) in enumerate(zip(rmsrange,ax2f)):
             ax,tit,loc=((ax4,tit2,loc2) if a else (ax3,tit1,loc1))
             #pdb.set_trace()
-            rms=rms_power(f,p,rmsrange=fr,squeeze=False)
+            rms=rms_bands[i]
             if fr[0] is None: fr[0]=min(f)
             if fr[1] is None: fr[1]=max(f)
             sty=next(c)
@@ -188,29 +348,50 @@ def plot_rms_power(f,p,x=None,rmsrange=None,ax2f=None,units=None,*args,**kwargs)
 
 
 #PROCESS MULTIPLE DATA AT ONCE
-def multipsd2(datalist,wfun=None):
+def multipsd2(datalist,wfun=None,workers=None):
     """return two lists of vectors respectively freq and avg psd2
-    each list has vectors respectively for y and x for data must be passed as list of tuples, each one in form (wdata,xwg,ywg)"""
+    each list has vectors respectively for y and x for data must be passed as list of tuples, each one in form (wdata,xwg,ywg)
+    Data on the same grid are stacked and their psds calculated together with `psd2d_stack`.
+    2026/10/18 data on same grid are batched."""
+    
+    # group indices of data with same grid
+    groups={}
+    for i,(wdata,xwg,ywg) in enumerate(datalist):
+        key=(np.shape(wdata),np.asarray(xwg).tobytes(),np.asarray(ywg).tobytes())
+        groups.setdefault(key,[]).append(i)
+    
+    res=[None]*len(datalist)
+    for ii in groups.values():
+        wdata,xwg,ywg=datalist[ii[0]]
+        stack=np.stack([datalist[i][0] for i in ii])
+        fw1y,_,pw1yavg=psd2d_stack(stack,xwg,ywg,wfun=wfun,workers=workers) #psds along y
+        fw1x,_,pw1xavg=psd2d_stack(np.swapaxes(stack,1,2),ywg,xwg,wfun=wfun,workers=workers) #psds along x
+        for j,i in enumerate(ii):
+            res[i]=([fw1y,fw1x],[pw1yavg[j],pw1xavg[j]])
+    
     flist=[]
     psdlist=[]
-    for i,(wdata,xwg,ywg) in enumerate(datalist):
-        fw1y,pw1y=psd2d(wdata,xwg,ywg) #psds along y
-        fw1x,pw1x=psd2d(wdata.T,ywg,xwg) #psds along x
-        pw1yavg=avgpsd2d(pw1y)  #y
-        pw1xavg=avgpsd2d(pw1x)  #x
-        flist.extend([fw1y,fw1x])
-        psdlist.extend([pw1yavg,pw1xavg])
+    for fl,pl in res:
+        flist.extend(fl)
+        psdlist.extend(pl)
         #result.append(((fw1,pw1avg),(fw1m,pw1mavg)))
 
     return flist,psdlist
 
-def multipsd3(wdata,xwg,ywg,wfun=None):
+def multipsd3(wdata,xwg,ywg,wfun=None,workers=None):
     """return two lists respectively freq and psd2d
     each list has vectors respectively for y and x for each data set passed.
-    data must be passed as list of tuples, each one in form (wdata,xwg,ywg)"""
-
-    fw1y,pw1y=psd2d(wdata,xwg,ywg) #psds along y
-    fw1x,pw1x=psd2d(wdata.T,ywg,xwg) #psds along x
+    data must be passed as list of tuples, each one in form (wdata,xwg,ywg)
+    `wdata` can also be a (N, ny, nx) stack of data on the same grid, psds are then 
+    (N, nf, nx) and (N, nf, ny) stacks calculated with `psd2d_stack`.
+    2026/10/18 added stacks."""
+
+    if np.ndim(wdata)==3:
+        fw1y,pw1y,_=psd2d_stack(wdata,xwg,ywg,wfun=wfun,workers=workers) #psds along y
+        fw1x,pw1x,_=psd2d_stack(np.swapaxes(wdata,1,2),ywg,xwg,wfun=wfun,workers=workers) #psds along x
+    else:
+        fw1y,pw1y=psd2d(wdata,xwg,ywg,wfun=wfun,workers=workers) #psds along y
+        fw1x,pw1x=psd2d(wdata.T,ywg,xwg,wfun=wfun,workers=workers) #psds along x
 
     return [fw1y,fw1x],[pw1y,pw1x]
 
@@ -856,6 +1037,41 @@ def test_psd2d():
     plt.colorbar()
 
 
+def test_psd_plan(shape=(1000,1000),n=20,wfun=np.hanning,workers=None):
+    """benchmark `n` repeated psd2d of random data of fixed `shape`,
+    with and without reusing cached psd plans."""
+    import time
+    
+    data = np.random.random(shape)
+    x,y = np.arange(shape[1]),np.arange(shape[0])
+    
+    t0 = time.time()
+    for i in range(n):
+        psd_plan.cache_clear()
+        f0,p0 = psd2d(data,x,y,wfun=wfun,rmsnorm=True)
+    t1 = time.time()
+    for i in range(n):
+        f1,p1 = psd2d(data,x,y,wfun=wfun,rmsnorm=True,workers=workers)
+    t2 = time.time()
+    
+    assert np.allclose(p0,p1) and np.array_equal(f0,f1)
+    print('%i psd2d %s, no plan cache: %.4f s, cached plan (workers=%s): %.4f s'%(n,shape,t1-t0,workers,t2-t1))
+    return t1-t0,t2-t1
+
+def test_psd2d_stack(n=3,shape=(100,140),nperseg=32):
+    """compare `psd2d_stack` with `psd2d` on each surface, with and without Welch mode."""
+    
+    data = np.random.random((n,)+shape)
+    data[1,10:20,5] = np.nan
+    x,y = np.arange(shape[1]),np.arange(shape[0])
+    for kw in ({},{'nperseg':nperseg}):
+        f,psds,avg = psd2d_stack(data,x,y,**kw)
+        for i in range(n):
+            f1,p1 = psd2d(data[i],x,y,**kw)
+            assert np.array_equal(f,f1) and np.allclose(psds[i],p1,equal_nan=True)
+        print(kw,'psds shape',psds.shape)
+    return f,psds,avg
+    
 def mwc(psd3,prange):
     """plots a test case"""
     plt.title(str(prange))
@@ -24,16 +24,17 @@ from pySurf.points import crop_points
 from pySurf.points import points_find_grid
 from pySurf.points import resample_grid
 from pySurf.readers.read_sur_files import readsur
-from pySurf.readers.read_metropro_files import readMetroProData
+from pySurf.readers.read_metropro_files import readMetroProData, scaleMetroProData
 #from utilities.imaging.man import stripnans
 from pySurf.data2D import data_from_txt
 
 from dataIO.read_pars_from_namelist import read_pars_from_namelist
 from dataIO.fn_add_subfix import fn_add_subfix
+from dataIO.cache import cached_reader
 from .test_readers import testfolder
 from IPython.display import display
 
-from .nid_reader import read_nid, make_channel_tags, read_datablock
+from .nid_reader import read_nid, make_channel_tags, read_datablock, nid_block_offsets
 
 import pdb
 
@@ -48,7 +49,10 @@ def points_reader(wfile,header=False,*args,**kwargs):
     return pdata,x,y
 
 def datzygo_reader(wfile,header=False,*args,**kwargs):
-    """read .dat binary files (MetroPro/Zygo)."""
+    """read .dat binary files (MetroPro/Zygo).
+    
+    Extra arguments are passed to `readMetroProData` (e.g. `intensity`, `mmap`),
+    with `mmap` the memory-mapped raw data are scaled here, without an in-memory copy of raw data."""
     
     '''from manual: Complete maps of the header formats can be obtained by running the dat_test.exe 
 program that is included with MetroPro in folder C:\MetroPro\Bin. Type the following at 
@@ -56,6 +60,8 @@ a command prompt:
 dat_test  –maps  >  maps.txt 
 File maps.txt will contain the output. '''
     d1,head,d3,d4=readMetroProData(wfile,*args,**kwargs)
+    if kwargs.get('mmap',False):
+        d1=scaleMetroProData(d1,head,kwargs.get('intensity',False))
     #pdb.set_trace()
     if header or kwargs.get('header',False): return head
     try:
@@ -79,6 +85,7 @@ File maps.txt will contain the output. '''
     return data,x,y
 
 
+@cached_reader
 def csv4D_reader(wfile,ypix=None,ytox=None,header=False,delimiter=',',endline=True,skip_header=12,*args,**kwargs):
     """read csv data in 4sight 4D format.
     12 lines header with info in namelist format, uses `xpix`, `aspect` and `wavelength` if available.
@@ -87,7 +94,8 @@ def csv4D_reader(wfile,ypix=None,ytox=None,header=False,delimiter=',',endline=Tr
     Note also that typically instruments invert y axis, but this is not implemented at the moment. 
     TODO: change y scale after code reorganization.
     2020/07/14 read data directly with `np.genfromtxt`,
-    rather than uselessely launching the wrapper `data2D.data_from_txt`."""
+    rather than uselessely launching the wrapper `data2D.data_from_txt`.
+    Results can be cached on disk with `cache=True` (see `dataIO.cache`)."""
 
     head=read_pars_from_namelist(wfile,': ') #this returns a dictionary, order is lost if header is returned.
     if header:
@@ -129,6 +137,50 @@ def csv4D_reader(wfile,ypix=None,ytox=None,header=False,delimiter=',',endline=Tr
     return data,x,y
 
 
+def _read_zygo_section(myfile,size=None,xyz=False,chunksize=10000):
+    """read a data section of Zygo ASCII file from current position of open file `myfile`,
+    up to the line containing `#`. 
+    
+    Values are parsed in chunks of `chunksize` lines and stored in a preallocated 
+    integer array of `size` elements. If `xyz` is set, return a float Nx3 array
+    of points, with "No Data" converted to nan (size is not needed)."""
+    
+    def parse(lines):
+        text = ''.join(lines)
+        if xyz:
+            text = text.replace('No Data','nan')
+            return np.fromstring(text,dtype=float,sep=' ')
+        return np.fromstring(text,dtype=np.int64,sep=' ')
+
+    chunks = []  # used only for xyz, where size is not known
+    if not xyz:
+        data = np.empty(size,dtype=np.int64)
+    n = 0
+    lines = []
+    for line in myfile:
+        end = line.strip() == '#'
+        if not end:
+            lines.append(line)
+        if lines and (end or len(lines) == chunksize):
+            v = parse(lines)
+            lines = []
+            if xyz:
+                chunks.append(v)
+            else:
+                if n+v.size > size:
+                    raise ValueError('Data in file exceed size declared in header (%i)'%size)
+                data[n:n+v.size] = v
+            n = n+v.size
+        if end:
+            break
+
+    if xyz:
+        return np.concatenate(chunks).reshape(-1,3) if chunks else np.zeros((0,3))
+    if n != size:
+        raise ValueError('Number of data in file (%i) different from size declared in header (%i)'%(n,size))
+    return data
+    
+
 def csvZygo_reader(wfile,intensity=False,header=False,xyz=False,*args,**kwargs):
 
     """read .csv zygo files (and .xyz).
@@ -140,6 +192,12 @@ def csvZygo_reader(wfile,intensity=False,header=False,xyz=False,*args,**kwargs):
       ypix defaults to CameraRes
       ytox defaults to 1. 
       zscale defaults to WavelengthIn*1000000. #original unit is m, convert to um
+      chunksize (default 10000) number of lines parsed at once, 
+        data are streamed from file in chunks, so memory is bounded by 
+        the final arrays.
+    
+    XYZ points are on the pixel lattice and are placed directly in the matrix,
+      without resampling ("No Data" points are left as nan).
     
     ### XYZ format:
     XYZ Data File Connected Phase Data
@@ -187,9 +245,8 @@ def csvZygo_reader(wfile,intensity=False,header=False,xyz=False,*args,**kwargs):
     """
 
     with open(wfile) as myfile:
-        raw = myfile.readlines()
-
-    head,d=raw[:15],raw[15:]
+        head = [myfile.readline() for i in range(15)]
+        pos = myfile.tell()
     if header: return head
 
     nx,ny = list(map( int , head[8].split()[:2] ))
@@ -244,20 +301,29 @@ def csvZygo_reader(wfile,intensity=False,header=False,xyz=False,*args,**kwargs):
         zscale=kwargs.pop('zscale',WavelengthIn*1000000.)#original unit is m, convert to um
 
     #pdb.set_trace()
-    if xyz:
-        tmp = [dd.replace('No Data','nan') for dd in d[:-1]]
-        tmp = np.array([l.split() for l in tmp],dtype='float')
-        from pySurf.points import resample_grid
-        tmp = resample_grid(tmp,matrix=True)
-        datasets=[np.array([]),tmp]
-        #return datasets[-1]
-    else:
-        datasets=[np.array(aa.split(),dtype=int)  for aa in ' '.join(map(str.strip,d)).split('#')[:-1]]
+    # data are parsed in chunks of lines directly into preallocated arrays.
+    chunksize=kwargs.pop('chunksize',10000)
+    with open(wfile) as myfile:
+        myfile.seek(pos)
+        if xyz:
+            # points are already on pixel lattice, put them directly in place.
+            tmp = _read_zygo_section(myfile,xyz=True,chunksize=chunksize)
+            ix,iy = tmp[:,0].astype(int),tmp[:,1].astype(int)
+            ix,iy = ix-ix.min(),iy-iy.min()
+            d2 = np.full(connected_size[::-1],np.nan)
+            d2[iy,ix] = tmp[:,2]
+            datasets=[np.array([]),d2]
+            #return datasets[-1]
+        else:
+            # IntensWidth * IntensHeight * NBuckets, PhaseWidth * PhaseHeight
+            isize=np.prod(list(map(int,head[2].split()[2:5])))
+            datasets=[_read_zygo_section(myfile,isize,chunksize=chunksize),
+                      _read_zygo_section(myfile,np.prod(connected_size),chunksize=chunksize)]
     #here rough test to plot things
     d1,d2=datasets  #d1 intensity, d2 phase as 1-d arrays
     
     d1,d2=d1.astype(float),d2.astype(float)
-    if np.size(d1) > 0: d1 = d1.reshape(ny,nx)
+    if np.size(d1) > 0: d1 = d1[:nx*ny].reshape(ny,nx)
     if np.size(d2) > 0: d2 = d2.reshape(*connected_size[::-1])
     
     '''    
@@ -308,7 +374,10 @@ def fits_reader(fitsfile,header=False):
 from .read_sur_files import readsur
 
 def sur_reader(wfile,header=False,*args,**kwargs):
-    """read .sur binary files."""
+    """read .sur binary files.
+    
+    Extra arguments are passed to `readsur`, e.g. `rows` and `cols` to read
+    only a window of data."""
     head=readsur(wfile,*args,**kwargs)
     if header: return head
 
@@ -331,7 +400,7 @@ def nid_reader(file,index=0,header=False,*args,**kwargs):
     return data,x,y
 
 
-def read_nid(file_name,index=0,header=False):
+def read_nid(file_name,index=0,header=False,mmap=False):
     """read a file nid. Return a list of `data,x,y` for the scans of index in `index`.
     
     `data,x,y` are extracted from files and adjusted by using 
@@ -354,12 +423,16 @@ def read_nid(file_name,index=0,header=False):
     `read_raw_nid` reads `header` as list of strings and `data` as
     single binary block. `read_datablock` is used to extract an image
     from the datablock. `dataIO.config.string_to_config` can be used by converting it to `config`
-    object and reading fields."""
+    object and reading fields.
+    
+    Only the data blocks of channels in `index` are converted, as views on the 
+    raw data (memory-mapped file if `mmap` is set).
+    Raise ValueError if a channel in `index` is not in the file."""
     
     from pySurf.readers.nid_reader import read_raw_nid,read_nid
     from dataIO.config.make_config import string_to_config
     import logging
-    meta, data = read_raw_nid(file_name) 
+    meta, data = read_raw_nid(file_name, mmap=mmap) 
     
     if header: return meta
     
@@ -368,64 +441,67 @@ def read_nid(file_name,index=0,header=False):
     
     # create itag, a (ordered) list of frame keys
     itag = make_channel_tags(meta)
+    # position of each data block, only blocks in `index` are read
+    offsets = nid_block_offsets(config, itag)
     
     # all columns of the matrix 
     #ngroups = config.get('DataSet','GroupCount') #number of groups 
     imgdic=[]
     logging.info('reading '+file_name)
     #print('reading '+file_name)
-    if np.ndim(index) == 0:
-        scalar = True # flag, will return scalar
+    scalar = np.ndim(index) == 0 # flag, will return scalar
+    if scalar:
         index=[index]
+    available = [t for t in itag if config.has_option('DataSet',t)]
+    missing = [itag[i] if -len(itag) <= i < len(itag) else 'index %s'%i for i in index
+               if not (-len(itag) <= i < len(itag) and config.has_option('DataSet',itag[i]))]
+    if missing:
+        raise ValueError('channel(s) %s not found in %s, available channels: %s (index %s)'%(
+            missing, file_name, available, [itag.index(t) for t in available]))
     for i in index:
         cgtag = itag [i]   
         # all raws of the actual column   
         #pdb.set_trace() 
         print(cgtag)
-        try:
-            datatag = config.get('DataSet',cgtag)
-            # then read the header, specially �Points� and �Lines� 
-            #ReadDataSetInfo(datatag)    
-            npoints = int(config.get(datatag,'Points'))
-            nlines = int(config.get(datatag,'Lines' ))
-            nbits = int(config.get(datatag,'SaveBits'))
-            sign = config.get(datatag,'SaveSign')
-            if (int(nbits) != 32) or sign !='Signed':
-                raise ValueError
-            else:
-                fmt = '<l'    
-            img = read_datablock(data, npoints, nlines, nbits)
-            
-            #npoints nlines might be inverted
-            Dim0Range = float(config.get(datatag,'Dim0Range'))
-            Dim0Min = float(config.get(datatag,'Dim0Min'))
-            x = np.arange(npoints) / (npoints-1)  * Dim0Range + Dim0Min
-            
-            Dim1Range = float(config.get(datatag,'Dim1Range'))
-            Dim1Min = float(config.get(datatag,'Dim1Min'))
-            y = np.arange(nlines) / (nlines-1) * Dim1Range + Dim1Min
-            
-            Dim2Range = float(config.get(datatag,'Dim2Range'))
-            Dim2Min = float(config.get(datatag,'Dim2Min'))
-            img = (img + 2**(nbits-1)) / (2**nbits-1) * Dim2Range + Dim2Min
-            # z_value = (z_data + 2^(SaveBits-1)) / (2^SaveBits-1)  * Dim2Range + Dim2Min
-            imgdic.append([img,x,y])
-            units = [config.get(datatag,'Dim0Unit'),
-                        config.get(datatag,'Dim1Unit'),
-                        config.get(datatag,'Dim2Unit')]
-            
-            #if units != ['m','m','m']: 
-                #raise NotImplementedError('unknown units in read_nid: ',units)
-            print(units)
-            
-            #print(points)
-            #ReadBinData()
-            logging.info(cgtag+' read')
-            #print (cgtag+' read')
-        except NoOptionError:
-            logging.info('option '+cgtag+' not found')
-            #print('option '+cgtag+' not found')
-            pass
+        datatag = config.get('DataSet',cgtag)
+        # then read the header, specially �Points� and �Lines� 
+        #ReadDataSetInfo(datatag)    
+        npoints = int(config.get(datatag,'Points'))
+        nlines = int(config.get(datatag,'Lines' ))
+        nbits = int(config.get(datatag,'SaveBits'))
+        sign = config.get(datatag,'SaveSign')
+        if (int(nbits) != 32) or sign !='Signed':
+            raise ValueError('channel %s in %s has unsupported format: %s bits %s'%(cgtag, file_name, nbits, sign))
+        else:
+            fmt = '<l'    
+        img = read_datablock(data, npoints, nlines, nbits, fmt=fmt, offset=offsets[cgtag][0])
+        
+        #npoints nlines might be inverted
+        Dim0Range = float(config.get(datatag,'Dim0Range'))
+        Dim0Min = float(config.get(datatag,'Dim0Min'))
+        x = np.arange(npoints) / (npoints-1)  * Dim0Range + Dim0Min
+        
+        Dim1Range = float(config.get(datatag,'Dim1Range'))
+        Dim1Min = float(config.get(datatag,'Dim1Min'))
+        y = np.arange(nlines) / (nlines-1) * Dim1Range + Dim1Min
+        
+        Dim2Range = float(config.get(datatag,'Dim2Range'))
+        Dim2Min = float(config.get(datatag,'Dim2Min'))
+        img = np.add(img, 2**(nbits-1), dtype=float) / (2**nbits-1) * Dim2Range + Dim2Min
+        # z_value = (z_data + 2^(SaveBits-1)) / (2^SaveBits-1)  * Dim2Range + Dim2Min
+        imgdic.append([img,x,y])
+        units = [config.get(datatag,'Dim0Unit'),
+                    config.get(datatag,'Dim1Unit'),
+                    config.get(datatag,'Dim2Unit')]
+        
+        #if units != ['m','m','m']: 
+            #raise NotImplementedError('unknown units in read_nid: ',units)
+        print(units)
+        
+        #print(points)
+        #ReadBinData()
+        logging.info(cgtag+' read')
+        #print (cgtag+' read')
 
     if scalar:
         imgdic = imgdic[0]
@@ -35,41 +35,77 @@ SaveSign=Signed
 SaveOrder=Intel
 """
 
-def read_raw_nid (file_name):
-    """return header and raw data (all data blocks together) from file_name"""
+def read_raw_nid (file_name, mmap=False):
+    """return header and raw data (all data blocks together) from file_name.
+    
+    File is read in a single pass, `#!` marker separating header from data
+    is searched once. If `mmap` is set, file is memory-mapped and `data` is a
+    read-only `memoryview` on the file, so that data blocks are read only when accessed,
+    otherwise `data` is a `memoryview` on the file content in memory.
+    In both cases, slicing `data` or reading blocks with `read_datablock` doesn't copy."""
    
     with open(file_name, 'rb') as binfile:
-        lines = binfile.readlines()
-
-    header=[]
-    for i,l in enumerate(lines):
-        text = l.decode('ansi')
-        if '#!' in text:
-            break
-        header.append(text.strip())
-
-    with open(file_name, 'rb') as binfile:
-        a=binfile.read()
+        if mmap:
+            import mmap as _mmap
+            a = _mmap.mmap(binfile.fileno(), 0, access=_mmap.ACCESS_READ)
+        else:
+            a = binfile.read()
     i = a.find(b'#!')
-
-    data = a[i+2:]
+    
+    # the line containing the marker is not included in header
+    header = [l.decode('cp1252').strip() for l in a[:i].split(b'\n')[:-1]]
+    data = memoryview(a)[i+2:]
     
     return header,data
 
-def read_datablock(data, npoints, nlines, nbits, nim=0, fmt = '<l'):
+def read_datablock(data, npoints, nlines, nbits, nim=0, fmt = '<l', offset=None):
     """read image of index nim from binary data.
     
     nbits is redundant, can be obtained from fmt.
     fmt is c-style format string,
     see https://docs.python.org/3.5/library/struct.html#struct-format-strings for other formats
+    (only byte order and sign are used, size is given by nbits).
+    If `offset` (in bytes) is provided, it is used in place of `nim`, this is needed
+    when blocks have different size (see `nid_block_offsets`).
+    
+    Return a read-only integer view on `data` (no copy is made).
     """
     if nbits%8 != 0: raise ValueError
     imsize=npoints*nlines*nbits//8
-    buf2 = io.BytesIO(data[nim*imsize:(nim+1)*imsize])
-    idata = struct.iter_unpack(fmt,buf2.read())
-    a=list(idata)
-    img = np.array(a).reshape((nlines,npoints))
-    return img
+    if offset is None:
+        offset = nim*imsize
+    dtype = np.dtype(fmt[0] + ('i' if fmt[-1].islower() else 'u') + str(nbits//8))
+    img = np.frombuffer(data, dtype=dtype, count=npoints*nlines, offset=offset)
+    return img.reshape((nlines,npoints))
+
+def nid_block_offsets(config, itag=None):
+    """return a dictionary with channel tag as key and (offset, npoints, nlines, nbits) of
+    corresponding data block as value. 
+    
+    `config` is a config object built from header (see `string_to_config`),
+    `itag` is the list of channel tags as returned by `make_channel_tags` 
+    (built from `config` if not provided). 
+    Data blocks are assumed consecutive in same order as `itag`, channels not
+    present in `config` are skipped."""
+    
+    if itag is None:
+        ngroups = config.get('DataSet','GroupCount')
+        itag = ['Gr%i-Ch%i'%(g,c) for g in range(int(ngroups)) 
+                for c in range(1,int(config.get('DataSet','Gr%i-Count'%g))+1)]
+    
+    offsets = {}
+    offset = 0
+    for cgtag in itag:
+        try:
+            datatag = config.get('DataSet',cgtag)
+        except NoOptionError:
+            continue
+        npoints = int(config.get(datatag,'Points'))
+        nlines = int(config.get(datatag,'Lines' ))
+        nbits = int(config.get(datatag,'SaveBits'))
+        offsets[cgtag] = (offset, npoints, nlines, nbits)
+        offset = offset + npoints*nlines*nbits//8
+    return offsets
 
 def make_channel_tags(meta):
     """ builds list of fixed format string with channel identifiers.
@@ -147,7 +183,7 @@ def read_nid(file_name):
                 
                 Dim2Range = float(config.get(datatag,'Dim2Range'))
                 Dim2Min = float(config.get(datatag,'Dim2Min'))
-                img = (img + 2**(nbits-1)) / (2**nbits-1) * Dim2Range + Dim2Min
+                img = np.add(img, 2**(nbits-1), dtype=float) / (2**nbits-1) * Dim2Range + Dim2Min
                 # z_value = (z_data + 2^(SaveBits-1)) / (2^SaveBits-1)  * Dim2Range + Dim2Min
                 imgdic[cgtag] = [img,x,y]
                 i=i+1
@@ -1882,11 +1882,36 @@ def read_map(filename, mapFormat='finesse', scaling=1.0e-9):
         return smap
 '''
     
-def readMetroProData(filename):
+def scaleMetroProData(raw, hData, intensity=False):
+    '''
+    Convert `raw` integer data (or any part of them) as read from file to float,
+    with invalid points set to nan and phase scaled to meters 
+    (intensity is in counts), `hData` is the header from `readHeaderMP`.
+    '''
+    dat = np.asarray(raw).astype(float)
+    if intensity:
+        dat[dat >= hData['intInvalid']] = np.nan
+    else:
+        # Marking unmeasured data as NaN
+        dat[dat >= hData['invalid']] = np.nan
+        # Scale data to meters
+        dat *= hData['convFactor']
+    return dat
+
+def readMetroProData(filename, intensity=False, mmap=False):
     '''
     Reading the metroPro binary data files.
 
     Translated from 'LoadMetroProData.m' by Hiro Yamamoto.
+    
+    Data blocks are decoded in bulk with a single big-endian view (see
+    `BinaryReader.read_array`), results are identical to the old per-pixel
+    `struct.unpack` loop (still available as `BinaryReader.read(..., bulk=False)`).
+    If `intensity` is set, the intensity map is returned in place of phase
+    (in counts, invalid points set to nan).
+    If `mmap` is set, data are a read-only memory-mapped view on file of the integers 
+    as stored (with same shape and orientation), nothing is read until accessed.
+    Convert them (or a part of them) with `scaleMetroProData(dat, hData, intensity)`.
     '''
     f = BinaryReader(filename)
     # Read header
@@ -1894,17 +1919,25 @@ def readMetroProData(filename):
     if hData['format'] < 0:
         print('Error: Format unknown to readMetroProData()\nfilename: {:s}'.format(filename))
         return 0
-    # Read phase map data
-    # Skipping header and intensity data
-    f.seek(hData['size']+hData['intNBytes'])
-    # Reading data
-    dat = f.read('int32',size=hData['Nx']*hData['Ny'])
-    # Marking unmeasured data as NaN
-    dat[dat >= hData['invalid']] = np.nan
-    # Scale data to meters
-    dat = dat*hData['convFactor']
+    if intensity:
+        # Intensity data start right after header, one uint16 per pixel and bucket.
+        # Only first bucket is returned.
+        if hData['intNBytes'] == 0:
+            raise ValueError('No intensity data in file %s'%filename)
+        nx, ny = hData['intNx'], hData['intNy']
+        f.seek(hData['size'])
+        raw = f.read_array('uint16', size=nx*ny, mmap=mmap)
+    else:
+        nx, ny = hData['Nx'], hData['Ny']
+        # Read phase map data
+        # Skipping header and intensity data
+        f.seek(hData['size']+hData['intNBytes'])
+        # Reading data
+        raw = f.read_array('int32', size=nx*ny, mmap=mmap)
+    dat = raw if mmap else scaleMetroProData(raw, hData, intensity)
+    del raw
     # Reshaping into Nx * Ny matrix
-    dat = dat.reshape(hData['Ny'], hData['Nx'])
+    dat = dat.reshape(ny, nx)
     # Flipping up/down, i.e., change direction of y-axis.
     dat = dat[::-1,:]
     # Auxiliary data to return
@@ -1944,6 +1977,11 @@ def readHeaderMP(f):
         hData['format'] = -1
     # Read necessary data
     hData['invalid'] = int('7FFFFFF8',16)
+    # Size of intensity data (first bucket), used only if intensity is read.
+    f.seek(52)
+    hData['intNx'] = f.read('uint16')
+    hData['intNy'] = f.read('uint16')
+    hData['intInvalid'] = 65535
     f.seek(60)
     # Intensity data, which we will skip over.
     hData['intNBytes'] = f.read('int32')
@@ -2007,7 +2045,12 @@ class BinaryReader:
     def __init__(self, fileName):
         self.file = open(fileName, 'rb')
         
-    def read(self, typeName, size=None):
+    def read(self, typeName, size=None, bulk=True):
+        """Read a single value, or an array of `size` values as float.
+        
+        With `bulk` (default) the array is decoded with a single numpy view,
+        otherwise it is unpacked value by value (old, slow behavior, kept for 
+        comparison)."""
         typeFormat = BinaryReader.typeNames[typeName.lower()]
         typeFormat = '>'+typeFormat
         typeSize = struct.calcsize(typeFormat)
@@ -2016,6 +2059,8 @@ class BinaryReader:
             if typeSize != len(value):
                 raise BinaryReaderEOFException
             unpacked = struct.unpack(typeFormat, value)[0]
+        elif bulk:
+            unpacked = self.read_array(typeName, size).astype(float)
         else:
             value = self.file.read(size*typeSize)
             if size*typeSize != len(value):
@@ -2026,6 +2071,28 @@ class BinaryReader:
                 unpacked[k] = struct.unpack(typeFormat,value[i:i+typeSize])[0]
         return unpacked
 
+    def read_array(self, typeName, size, mmap=False):
+        """Read `size` values from current position as a big-endian array of type `typeName`,
+        without conversion.
+        
+        If `mmap` is set, return a read-only `np.memmap` on the file, 
+        data are read from disk only when accessed."""
+        dtype = np.dtype('>'+BinaryReader.typeNames[typeName.lower()])
+        offset = self.file.tell()
+        nbytes = size*dtype.itemsize
+        if mmap:
+            self.file.seek(0, 2)
+            if self.file.tell() < offset + nbytes:
+                raise BinaryReaderEOFException
+            unpacked = np.memmap(self.file, dtype=dtype, mode='r', offset=offset, shape=(size,))
+            self.file.seek(offset + nbytes)
+        else:
+            value = self.file.read(nbytes)
+            if nbytes != len(value):
+                raise BinaryReaderEOFException
+            unpacked = np.frombuffer(value, dtype=dtype)
+        return unpacked
+
     def seek(self, offset, refPos=0):
         '''
         offset in bytes and refPos gives reference position, where 0
@@ -2038,6 +2105,38 @@ class BinaryReader:
     def __del__(self):
         self.file.close()
 
+
+
+def test_bulk_read(filename=None, n=3):
+    """Compare bulk decoding of phase data with the old per-pixel `struct.unpack` loop.
+    
+    Check results are identical and print timings (best of `n`)."""
+    import os
+    import timeit
+    
+    if filename is None:
+        filename = os.path.join(os.path.dirname(__file__),'..','test','input_data',
+                                'newview','05_C1S01.dat')
+    
+    def read_phase(bulk):
+        f = BinaryReader(filename)
+        hData = readHeaderMP(f)
+        f.seek(hData['size']+hData['intNBytes'])
+        return f.read('int32', size=hData['Nx']*hData['Ny'], bulk=bulk)
+    
+    assert np.array_equal(read_phase(True), read_phase(False))
+    d1 = readMetroProData(filename)[0]
+    d2, hData = readMetroProData(filename, mmap=True)[:2]
+    assert isinstance(d2, np.memmap)
+    assert np.array_equal(d1, scaleMetroProData(d2, hData), equal_nan=True)
+    assert np.array_equal(d1[:10], scaleMetroProData(d2[:10], hData), equal_nan=True)
+    
+    tloop = min(timeit.repeat(lambda: read_phase(False), number=1, repeat=n))
+    tbulk = min(timeit.repeat(lambda: read_phase(True), number=1, repeat=n))
+    print('%s (%i points)'%(os.path.basename(filename), np.size(d1)))
+    print('loop: %.4f s, bulk: %.4f s, speedup: x%.1f'%(tloop, tbulk, tloop/tbulk))
+    return tloop, tbulk
+    
         
 # TODO: Add options for reading virgo maps, and .xyz zygo
     # maps (need .xys file for this). Binary ligo-maps?
@@ -36,8 +36,109 @@ def freadChar(fileID,n):
     
 class Res():
     pass
+
+# Header of Surf file format 2010, numbers refer to fields in `readsur` 
+# (original field by field reader). 
+# Fields starting with `_` are reserved or obsolete and are not returned.
+sur_header_dtype = np.dtype([
+    ('signature',           'S12'),     #1
+    ('format',              '<i2'),     #2
+    ('objNum',              '<i2'),     #3
+    ('version',             '<i2'),     #4
+    ('objType',             '<i2'),     #5
+    ('objName',             'S30'),     #6
+    ('operatorName',        'S30'),     #7
+    ('materialCode',        '<i2'),     #8
+    ('acquisitionType',     '<i2'),     #9
+    ('rangeType',           '<i2'),     #10
+    ('specialPoints',       '<i2'),     #11
+    ('absoluteHeights',     '<i2'),     #12
+    ('gaugeResolution',     '<f4'),     #13
+    ('_reserved',           'S4'),      #14
+    ('sizeOfPoints',        '<i2'),     #15
+    ('zMin',                '<i4'),     #16
+    ('zMax',                '<i4'),     #17
+    ('xPoints',             '<i4'),     #18
+    ('yPoints',             '<i4'),     #19
+    ('totalNumberOfPoints', '<i4'),     #20
+    ('xSpacing',            '<f4'),     #21
+    ('ySpacing',            '<f4'),     #22
+    ('zSpacing',            '<f4'),     #23
+    ('xName',               'S16'),     #24
+    ('yName',               'S16'),     #25
+    ('zName',               'S16'),     #26
+    ('xStepUnit',           'S16'),     #27
+    ('yStepUnit',           'S16'),     #28
+    ('zStepUnit',           'S16'),     #29
+    ('xLengthUnit',         'S16'),     #30
+    ('yLengthUnit',         'S16'),     #31
+    ('zLengthUnit',         'S16'),     #32
+    ('xUnitRatio',          '<f4'),     #33
+    ('yUnitRatio',          '<f4'),     #34
+    ('zUnitRatio',          '<f4'),     #35
+    ('imprint',             '<i2'),     #36
+    ('inverted',            '<i2'),     #37
+    ('levelled',            '<i2'),     #38
+    ('_obsolete1',          'S12'),     #39
+    ('startSeconds',        '<i2'),     #40
+    ('startMinutes',        '<i2'),     #41
+    ('startHours',          '<i2'),     #42
+    ('startDays',           '<i2'),     #43
+    ('startMonths',         '<i2'),     #44
+    ('startYears',          '<i2'),     #45
+    ('startWeekDay',        '<i2'),     #46
+    ('measurementDuration', '<f4'),     #47
+    ('_obsolete2',          'S10'),     #48
+    ('commentSize',         '<i2'),     #49
+    ('privateSize',         '<i2'),     #50
+    ('clientZone',          'S128'),    #51
+    ('xOffset',             '<f4'),     #52
+    ('yOffset',             '<f4'),     #53
+    ('zOffset',             '<f4'),     #54
+    ('tSpacing',            '<f4'),     #55
+    ('tOffset',             '<f4'),     #56
+    ('tStepUnit',           'S13'),     #57
+    ('tAxisName',           'S13')])    #58
+
+def _decode(b):
+    """convert bytes to string as `freadChar`."""
+    return "".join(map(chr,b)).strip('\x00')
+
+def _window(w):
+    """convert a window (None, slice or (start, stop) ) to slice."""
+    if w is None:
+        return slice(None)
+    if isinstance(w,slice):
+        return w
+    return slice(*w)
+
+def readsur_header(fileID):
+    """Read header of Surf file format 2010 from open file `fileID`, with a single
+    structured read. Return a `Res` object with header fields, file position is left at
+    beginning of data points.
+    
+    Numeric fields are returned as 1-element arrays for consistency with
+    original reader (except `x/yPoints`, that are integers)."""
+    
+    h = np.fromfile(fileID, sur_header_dtype, 1)
+    if len(h) == 0:
+        raise ValueError("file too short for sur header")
+    h = h[0]
+    res = Res()
+    for name in sur_header_dtype.names:
+        if name.startswith('_'): continue
+        if sur_header_dtype[name].kind == 'S':
+            setattr(res, name, _decode(h[name]))
+        else:
+            setattr(res, name, np.array([h[name]]))
+    res.xPoints = int(res.xPoints[0])
+    res.yPoints = int(res.yPoints[0])
+    
+    res.comment             =   _decode(fileID.read(int(res.commentSize[0])))  #59
+    res.private             =   _decode(fileID.read(int(res.privateSize[0])))  #60
+    return res
     
-def readsur(filepath,raw=False):
+def readsur(filepath,raw=False,mmap=False,rows=None,cols=None,scale=True):
     """
     reads surface data from Surf file format 2010. returns an object with all properties from the sur file.
     Data and axes are contained respectively in res.points, res.xAxis and res.yAxis.
@@ -50,125 +151,60 @@ def readsur(filepath,raw=False):
         res.points contains reshaped and scaled or as internally represented in the sur file 
             if `raw` flag is set True.
         res.x/yAxis contains the corresponding axis.
+    
+    Header is read in a single structured read (`sur_header_dtype`), the point block
+    is memory-mapped at its offset and only the selected window is scaled, 
+    so that peak memory is the size of the returned array.
+    `rows`, `cols` select a window of points as index ranges (start, stop) or slices,
+        axes are cropped accordingly and the rest of the file is not read.
+    If `scale` is False, points are returned as integers as stored in file
+        (scale with `(points - res.zMin) * res.zSpacing / res.zUnitRatio`).
+        If also `mmap` is set, these are a read-only memory-mapped view on file.
         
     ported to python by Vincenzo Cotroneo 2018/04/18 from matlab routine by Eike Foremny, v1.0 23.02.2017
         
     """
-    fileID = open(filepath, 'rb')
-    res=Res()
-
-    res.signature           =   freadChar(fileID,12);               #1
-    res.format              =   fread(fileID,1,'int16');            #2
-    res.objNum              =   fread(fileID,1,'int16');            #3
-    res.version             =   fread(fileID,1,'int16');            #4
-    res.objType             =   fread(fileID,1,'int16');            #5
-    res.objName             =   freadChar(fileID,30);               #6
-    res.operatorName        =   freadChar(fileID,30);               #7
-
-    res.materialCode        =   fread(fileID,1,'int16');            #8
-    res.acquisitionType     =   fread(fileID,1,'int16');            #9
-    res.rangeType           =   fread(fileID,1,'int16');            #10
-    res.specialPoints       =   fread(fileID,1,'int16');            #11
-    res.absoluteHeights     =   fread(fileID,1,'int16');            #12
-    res.gaugeResolution     =   fread(fileID,1,'single'); #fread(fileID,1,'float');            #13
-
-    freadChar(fileID,4);        #reserved space. for unknown reason this works in matlab, not in python  #14
-
-    #data format of pints
-    res.sizeOfPoints        =   fread(fileID,1,'int16');            #15
-
-    res.zMin                =   fread(fileID,1,'int32');            #16
-    res.zMax                =   fread(fileID,1,'int32');            #17
-
-    #Number of points per axis
-    res.xPoints             =   int(fread(fileID,1,'int32'))            #18
-    res.yPoints             =   int(fread(fileID,1,'int32'))            #19
-
-    res.totalNumberOfPoints =   fread(fileID,1,'int32');            #20
-    
-    #Distance between points
-    res.xSpacing            =   fread(fileID,1,'single') #'float'); #21
-    res.ySpacing            =   fread(fileID,1,'single') #'float'); #22
-    res.zSpacing            =   fread(fileID,1,'single') #'float'); #23
-
-    #Name of axis
-    res.xName               =   freadChar(fileID,16);               #24
-    res.yName               =   freadChar(fileID,16);               #25
-    res.zName               =   freadChar(fileID,16);               #26
-
-    #Unit of distance between points
-    res.xStepUnit           =   freadChar(fileID,16);               #27
-    res.yStepUnit           =   freadChar(fileID,16);               #28
-    res.zStepUnit           =   freadChar(fileID,16);               #29
+    with open(filepath, 'rb') as fileID:
+        res = readsur_header(fileID)
+        offset = fileID.tell()
 
-    #Unit of axis
-    res.xLengthUnit         =   freadChar(fileID,16);               #30
-    res.yLengthUnit         =   freadChar(fileID,16);               #31
-    res.zLengthUnit         =   freadChar(fileID,16);               #32
-
-    #Skaling of distance between points
-    res.xUnitRatio          =   fread(fileID,1,'single') #'float'); #33
-    res.yUnitRatio          =   fread(fileID,1,'single') #'float'); #34
-    res.zUnitRatio          =   fread(fileID,1,'single') #'float'); #35
-
-    res.imprint             =   fread(fileID,1,'int16') #'float'); #36
-    res.inverted            =   fread(fileID,1,'int16') #'float'); #37
-    res.levelled            =   fread(fileID,1,'int16') #'float'); #38
-    freadChar(fileID,12);       #obsolete                           #39
-
-    #timestamp
-    res.startSeconds        =   fread(fileID,1,'int16');            #40
-    res.startMinutes        =   fread(fileID,1,'int16');            #41
-    res.startHours          =   fread(fileID,1,'int16');            #42
-    res.startDays           =   fread(fileID,1,'int16');            #43
-    res.startMonths         =   fread(fileID,1,'int16');            #44
-    res.startYears          =   fread(fileID,1,'int16');            #45
-    res.startWeekDay        =   fread(fileID,1,'int16');            #46
-    res.measurementDuration =   fread(fileID,1,'single') #'float'); #47
-
-    freadChar(fileID,10);       #obsolete                           #48
-
-    #Size of comment field
-    res.commentSize         =   fread(fileID,1,'int16');            #49
-    res.privateSize         =   fread(fileID,1,'int16');            #50
-
-    res.clientZone          =   freadChar(fileID,128);              #51
-
-    #Axis offset
-    res.xOffset             =   fread(fileID,1,'single') #'float'); #52
-    res.yOffset             =   fread(fileID,1,'single') #'float'); #53
-    res.zOffset             =   fread(fileID,1,'single') #'float'); #54
-
-    #temperature scale
-    res.tSpacing            =   fread(fileID,1,'single') #'float'); #55
-    res.tOffset             =   fread(fileID,1,'single') #'float'); #56
-    res.tStepUnit           =   freadChar(fileID,13);               #57
-    res.tAxisName           =   freadChar(fileID,13);               #58
-
-    res.comment             =   freadChar(fileID,int(res.commentSize));  #59
-    res.private             =   freadChar(fileID,int(res.privateSize));  #60
-
-    #read datapoints
-    if res.sizeOfPoints == 16:                                       #61
-        res.points          =   fread(fileID,-1,'int16')
+    #read datapoints                                                #61
+    if res.sizeOfPoints == 16:
+        dtype = np.dtype('<i2')
     elif res.sizeOfPoints == 32:
-        res.points          =   fread(fileID,-1,'int32')        
+        dtype = np.dtype('<i4')
     else:
         raise ValueError("data lack property sizeOfPoints (or file is in the wrong format)")
-
-    if not(raw):
-        #reshape datapoints into 2D-Matrix
-        res.points       =   np.reshape(res.points,[res.yPoints,res.xPoints])   #switched x-y 20180503
+        
+    npoints = (os.path.getsize(filepath) - offset)//dtype.itemsize
+    if npoints == res.xPoints*res.yPoints:
+        shape = (res.yPoints,res.xPoints)   #switched x-y 20180503
                     #it was giving interlaced output with profilometer data (never noticed on square CCI images).
-
-    #Scale datapoints without Offset
-    res.points       =   (res.points-res.zMin) * res.zSpacing/ res.zUnitRatio;
+    else:
+        if rows is not None or cols is not None:
+            raise ValueError("number of points in file doesn't match size, cannot select a window.")
+        shape = (npoints,)
+    points = np.memmap(filepath, dtype=dtype, mode='r', offset=offset, shape=shape) if npoints else np.zeros(0,dtype)
+    
+    rows, cols = _window(rows), _window(cols)
+    if len(shape) == 2:
+        points = points[rows, cols]
+    if raw:
+        points = points.reshape(-1)
+
+    if scale:
+        #Scale datapoints without Offset
+        res.points = np.subtract(points, res.zMin, dtype=float)
+        res.points *= res.zSpacing
+        res.points /= res.zUnitRatio
+    else:
+        res.points = points if mmap else np.array(points)
+    del points
 
     #Generate Axis without Offset;
-    res.xAxis               =   np.linspace(0,res.xSpacing * res.xPoints/ res.xUnitRatio, res.xPoints);
-    res.yAxis               =   np.linspace(0,res.ySpacing * res.yPoints/ res.yUnitRatio, res.yPoints);
+    res.xAxis               =   np.linspace(0,res.xSpacing * res.xPoints/ res.xUnitRatio, res.xPoints)[cols];
+    res.yAxis               =   np.linspace(0,res.ySpacing * res.yPoints/ res.yUnitRatio, res.yPoints)[rows];
 
-    fileID.close();
     return res
     
 if __name__=="__main__":
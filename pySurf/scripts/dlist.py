@@ -22,7 +22,7 @@ from copy import deepcopy
 from dataIO.span import span
 from dataIO.fn_add_subfix import fn_add_subfix
 from pySurf.data2D import projection
-from pySurf.data2D_class import Data2D
+from pySurf.data2D_class import Data2D, PSD2D, DataStack
 from pySurf.data2D import levellegendre
 from pySurf.affine2D import find_rototrans,find_affine
 from pySurf.readers.instrumentReader import fitsWFS_reader
@@ -47,7 +47,54 @@ def topoints(data,level=None):
     plist = [d.topoints() for d in data]    
     return np.vstack(plist)
 
-def load_dlist(rfiles,reader=None,*args,**kwargs):
+def _read_data2d(file,reader,kwargs):
+    """read a single Data2D, top level function to be usable in process pool."""
+    return Data2D(file=file,reader=reader,**kwargs)
+
+def read_files(rfiles,readers,kwargs,workers=None,executor='thread'):
+    """Create a Data2D for each file in `rfiles`, using the corresponding element of
+    `readers` and `kwargs` (list of dictionaries of options for Data2D).
+    
+    If `workers` is None, files are read serially, otherwise
+    they are read concurrently in a pool of `workers` (0 for default size) threads 
+    (`executor='thread'`) or processes (`executor='process'`, readers and 
+    options must be picklable). `executor` can also be an existing `concurrent.futures.Executor`.
+    In both modes, files that fail are skipped with a warning and errors are collected.
+    Return a tuple (dlist,errors), where dlist is a Dlist in same order as `rfiles`, and 
+    errors is a list of (index, file, exception)."""
+    
+    from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+    
+    if workers is None:
+        pool = None
+        # call at result time, so that errors are handled as for futures
+        results = [(lambda f=f,r=r,k=k: _read_data2d(f,r,k)) for f,r,k in zip(rfiles,readers,kwargs)]
+    elif isinstance(executor,Executor):
+        pool = executor
+    elif executor == 'thread':
+        pool = ThreadPoolExecutor(max_workers=workers or None)
+    elif executor == 'process':
+        pool = ProcessPoolExecutor(max_workers=workers or None)
+    else:
+        raise ValueError("executor must be 'thread', 'process' or an Executor, not %s"%executor)
+    
+    try:
+        if pool is not None:
+            results = [pool.submit(_read_data2d,f,r,k).result for f,r,k in zip(rfiles,readers,kwargs)]
+        dlist,errors = [],[]
+        for i,(f,res) in enumerate(zip(rfiles,results)):
+            try:
+                dlist.append(res())
+            except Exception as e:
+                errors.append((i,f,e))
+                print ('WARNING: error reading file %s: %s'%(f,repr(e)))
+    finally:
+        if pool is not None and pool is not executor:
+            pool.shutdown()
+    
+    return Dlist(dlist),errors
+
+def load_dlist(rfiles,reader=None,*args,workers=None,executor='thread',**kwargs):
     """Extracted from plot_repeat. Read a set of rfiles to a dlist.
     readers and additional arguments can be passed as scalars or lists.
 
@@ -66,6 +113,11 @@ def load_dlist(rfiles,reader=None,*args,**kwargs):
                 'units':['mm','mm','um']},{'scale':(1,1,-1),
                 'units':['mm','mm','um']},{'scale':(-1,-1,1),
                 'units':['mm','mm','$\mu$m']}])
+                
+    If `workers` is set, files are read in parallel with a pool of threads or processes
+    according to `executor` (see `read_files`). Files that cannot be read are
+    skipped and errors are stored as list of (index, file, exception)
+    in the `errors` attribute of returned Dlist.
     2019/04/08 made function general from plot_repeat, moved to dlist.
     """
 
@@ -108,7 +160,7 @@ def load_dlist(rfiles,reader=None,*args,**kwargs):
     # 2020/07/10 args overwrite kwargs (try to avoid duplicates anyway).
     # args were ignored before.
     if not args:  #assume is correct number of elements
-        args = []*len(rfiles)
+        args = [{}]*len(rfiles)
     
     
     #pdb.set_trace()
@@ -116,7 +168,9 @@ def load_dlist(rfiles,reader=None,*args,**kwargs):
     kwargs=[{k:v[i] for k,v in kwargs.items()} for i in np.arange(len(rfiles))]
     
     #kwargs here is a list of dictionaries {option:value}, matching the readers
-    dlist=[Data2D(file=wf1,reader=r,**{**k, **a}) for wf1,r,k,a in zip(rfiles,reader,args,kwargs)]
+    dlist,errors=read_files(rfiles,reader,[{**k, **a} for k,a in zip(args,kwargs)],
+                            workers=workers,executor=executor)
+    dlist.errors=errors
 
     return dlist
 
@@ -266,10 +320,12 @@ def extract_psd(dlist,rmsthr=0.07,rmsrange=None,prange=None,ax2f=None,dis=False)
         display(plt.gcf())
     return m_tot
 
-def psd2d(dlist,ymax=None,subfix='_psd2d',*args,**kwargs):
+def psd2d(dlist,ymax=None,subfix='_psd2d',analysis=True,outfolder=None,*args,**kwargs):
     """2d psd analysis of a dlist. 
     Doesn't do any additional processing or plotting (must be done externally)
     [`outfolder` is being removed].
+    If `analysis` is False, no plot is generated and, if all data have same x and y, 
+    psds are calculated together (see `DataStack.psd`).
     Any parameter for `Data2D.psd` are accepted,
     however, parameters are not vectorized (must be the same for all data).
     [see example of vectorization e.g. in `load_dlist`] 
@@ -279,12 +335,24 @@ def psd2d(dlist,ymax=None,subfix='_psd2d',*args,**kwargs):
     ymax sets top of scale for rms right axis.
     if outfolder is provided, save psd2d_analysis plot with dlist names+subfix"""
     
+    if not analysis:
+        try:
+            stack = DataStack.from_dlist(dlist)
+        except ValueError:
+            stack = None
+        if stack is None or args:
+            return [dd.psd(*args,**kwargs) for dd in dlist]
+        kwargs.setdefault('rmsnorm',True)  # same default as `Data2D.psd`
+        ps = stack.psd(**kwargs)
+        return [PSD2D(p,ps.x,ps.y,units=ps.units,name=fn_add_subfix(dd.name,"")) 
+                for p,dd in zip(ps.data,dlist)]
+    
     m_psd=[]
     title = kwargs.pop('title','')
     #pdb.set_trace()
     for dd in dlist:
         m_psd.append(dd.psd(analysis=True,
-            title=title,wfun=wfun,*args,**kwargs))
+            title=title,*args,**kwargs))
         #psd2d_analysis(*dd.level(2,byline=True)(),
         #                 title=os.path.basename(outfolder),wfun=wfun,*args,**kwargs)
         #m_psd.append((fs,ps))
@@ -310,5 +378,10 @@ class Dlist(Superlist):
     
     def topoints(self,level=True):
         """convert a dlist to single set of points containing all data."""
-        plist = topoints(self.data,level = None)
-        return plist  
\ No newline at end of file
+        plist = topoints(self,level = None)
+        return plist
+    
+    def tostack(self,**kwargs):
+        """return a `DataStack` with data from all elements, that must have same x and y 
+        (e.g. after `resample`). `kwargs` are passed to `DataStack.from_dlist`."""
+        return DataStack.from_dlist(self,**kwargs)
@@ -164,7 +164,7 @@ def plot_data_repeat_leveling(dlist,outfile=None,dis=True,name = ""):
     return res
 
 
-def plot_repeat(rfiles,outfile=None,dis=True,name = "",plot_func=plot_data_repeat_leveling,ro=None):
+def plot_repeat(rfiles,outfile=None,dis=True,name = "",plot_func=plot_data_repeat_leveling,ro=None,workers=None,executor='thread'):
     """Functions to plot a list of files side to side (e.g. repeatability or reproducibility)
     with different levelings. Return list of Data2D objects.
     plot_func is a function that accepts a dlist and possibly accepts arguments
@@ -175,7 +175,10 @@ def plot_repeat(rfiles,outfile=None,dis=True,name = "",plot_func=plot_data_repea
     2019/04/08 made function general.
     2018/11/02 moved to scripts. Modified to make it format independent acting on
     data rather than on file extracting the data part in outer routine plot_data_repeat_leveling
-    in ."""
+    in .
+    `workers` and `executor` are used to read files in parallel (see `dlist.read_files`),
+    files that cannot be read are skipped, listed at the end and stored as (index, file, exception)
+    in `errors` attribute of returned Dlist."""
     
     plt.close('all')
 
@@ -190,9 +193,19 @@ def plot_repeat(rfiles,outfile=None,dis=True,name = "",plot_func=plot_data_repea
     #if name is None:
     #    name = os.path.basename(outfile) if outfile is not None else ""
     
-    dlist=[Data2D(file=wf1,**ro).level() for i,wf1 in enumerate(rfiles)]
+    from pySurf.scripts.dlist import read_files, Dlist
+    ro=dict(ro)
+    reader=ro.pop('reader',None)
+    dlist,errors=read_files(rfiles,[reader]*len(rfiles),[ro]*len(rfiles),
+                     workers=workers,executor=executor)
+    dlist=Dlist([d.level() for d in dlist])
     res = plot_func(dlist,outfile=outfile,dis=dis,name = name)
     
+    if errors:
+        print ('WARNING: %i of %i files could not be read and were skipped:'%(len(errors),len(rfiles)))
+        for i,f,e in errors:
+            print ('    %i %s: %s'%(i,f,repr(e)))
+    dlist.errors=errors
     
     return dlist
 
@@ -204,11 +217,22 @@ from pySurf.readers.format_reader import auto_reader
 def dcouples_plot(dlist,level=True,dis=False):
     """calculate rotating differences, data are supposed to be already aligned.
     Note, differences are not leveled.
+    If all data have same x and y, differences are calculated on a `DataStack`.
     if dis is set to True, call display after plots (not found a better way of doing this)."""
     
-    dcouples=[c[1]-c[0] for c in list(itertools.combinations(dlist, 2))]
-    if level:
-        dcouples=[d.level() for d in dcouples]
+    from pySurf.data2D_class import DataStack
+    
+    try:
+        stack = dlist if isinstance(dlist,DataStack) else DataStack.from_dlist(dlist)
+    except ValueError:
+        stack = None  # different grids, differences are resampled
+    if stack is not None:
+        # same grid, differences and leveling are vectorized on stack
+        dcouples=list(stack.differences(level=level))
+    else:
+        dcouples=[c[1]-c[0] for c in list(itertools.combinations(dlist, 2))]
+        if level:
+            dcouples=[d.level() for d in dcouples]
 
     plt.clf()
     maximize()